@@ -1,153 +1,74 @@
 # app.py
-from flask import Flask, render_template, request, jsonify, send_file, redirect, url_for, session
+from flask import Flask, render_template, request, jsonify, send_file, redirect, url_for, session, Response
 import os
 import uuid
 import zipfile
-from config import Config, allowed_file
+from config import Config, allowed_file, init_folders
 import re
-import unicodedata
-from urllib.parse import quote
+import io
 import tempfile
-import shutil
 import json
-from datetime import datetime
-# Импортируем фабрику генераторов
-from generators import GeneratorFactory
-# --- НОВОЕ: Импорт Pillow ---
-from PIL import Image
-# --- /НОВОЕ ---
-# Импортируем фабрику генераторов
+import hashlib
+from urllib.parse import quote
+# Импортируем фабрику генераторов (сами генераторы и openpyxl загружаются при первом использовании)
 from generators import GeneratorFactory
+# Хранилище файлов (локальная папка или S3)
+from storage import get_storage
+# Проверка архивов до распаковки и очередь на обработку
+from zip_preflight import ZipPreflightError, inspect_zip_archive, archive_admission
+# Индекс для поиска по артикулам
+from search_index import get_search_index
+# Компактные записи об изображениях (URL собираются при выводе)
+from image_record import ImageRecord, build_image_url, thumb_filename_for
+# Сохранение изображений и результатов (общее с watch_ingest.py)
+from ingest import (create_thumbnail, safe_folder_name, file_crc32, index_images, ingest_image_file,
+                    save_results_to_file, load_results_from_file)
+# Потоковая сборка ZIP-архива для скачивания оригиналов
+from zip_stream import StreamingZip
+# Профилирование медленных запросов по требованию
+from request_profiler import init_profiler, profile_store, to_collapsed
 
 app = Flask(__name__)
 app.config.from_object(Config)
-
-RESULTS_FOLDER = 'results'
-
-# Инициализируем папку для результатов
-if not os.path.exists(RESULTS_FOLDER):
-    os.makedirs(RESULTS_FOLDER)
-    print(f"Папка для результатов создана: {RESULTS_FOLDER}")
-
-
-# --- НОВОЕ: Функция для создания миниатюры ---
-def create_thumbnail(source_path, target_path, size=(90, 90)):
-    """
-    Создает миниатюру изображения.
-
-    Args:
-        source_path (str): Путь к исходному изображению.
-        target_path (str): Путь для сохранения миниатюры.
-        size (tuple): Размер миниатюры (ширина, высота).
-    """
-    try:
-        with Image.open(source_path) as img:
-            # Конвертируем в RGB если нужно (для PNG с прозрачностью)
-            if img.mode in ('RGBA', 'LA', 'P'):
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                if img.mode == 'P':
-                    img = img.convert('RGBA')
-                background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                img = background
-
-            # Используем LANCZOS для хорошего качества уменьшения
-            img.thumbnail(size, Image.Resampling.LANCZOS)
-
-            # Сохраняем миниатюру в формате JPEG для единообразия
-            if not target_path.lower().endswith(('.jpg', '.jpeg')):
-                target_path = os.path.splitext(target_path)[0] + '_thumb.jpg'
-
-            # Сохраняем с оптимизацией
-            img.save(target_path, "JPEG", quality=85, optimize=True)
-            print(f"Миниатюра создана: {target_path}")
-            return target_path
-    except Exception as e:
-        print(f"Ошибка при создании миниатюры {target_path}: {e}")
-        return None
-
-
-# --- /НОВОЕ ---
-
-def safe_folder_name(name: str) -> str:
-    """Преобразует строку в безопасное имя папки"""
-    if not name:
-        return "unnamed"
-    name = unicodedata.normalize('NFKD', name)
-    name = re.sub(r'[^\w\s-]', '', name, flags=re.UNICODE)
-    name = re.sub(r'[-\s]+', '-', name, flags=re.UNICODE).strip('-_')
-    return name[:255] if name else "unnamed"
+init_profiler(app)
 
 
 def process_zip_archive(zip_file, template_name):
     """Обрабатывает ZIP-архив и извлекает изображения"""
     image_urls = []
-    with tempfile.TemporaryDirectory() as temp_dir:
-        zip_path = os.path.join(temp_dir, zip_file.filename)
-        zip_file.save(zip_path)
-
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(temp_dir)
-
-        for root, dirs, files in os.walk(temp_dir):
-            for file in files:
-                if file.lower() in ['thumbs.db', '.ds_store']:
-                    continue
-                if not allowed_file(file):
-                    continue
-
-                relative_path = os.path.relpath(root, temp_dir)
-                if relative_path == '.':
-                    continue
-
-                article = os.path.basename(root) if relative_path.count(os.sep) == 0 else relative_path.split(os.sep)[0]
-
-                template_folder = safe_folder_name(template_name)
-                article_folder = safe_folder_name(article)
-                full_path = os.path.join(Config.UPLOAD_FOLDER, template_folder, article_folder)
-                os.makedirs(full_path, exist_ok=True)
-
-                file_extension = os.path.splitext(file)[1]
-                file_name_base = os.path.splitext(file)[0]
-                unique_suffix = uuid.uuid4().hex[:6]
-                unique_filename = f"{file_name_base}_{unique_suffix}{file_extension}"
-                target_file_unique = os.path.join(full_path, unique_filename)
-                source_file = os.path.join(root, file)
-                shutil.copy2(source_file, target_file_unique)
-
-                # --- НОВОЕ: Создание миниатюры с тем же уникальным суффиксом ---
-                thumb_file_name = f"{file_name_base}_{unique_suffix}_thumb.jpg"
-                thumb_target_path = os.path.join(full_path, thumb_file_name)
-                thumbnail_path = create_thumbnail(target_file_unique, thumb_target_path)
-
-                if not thumbnail_path:
-                    # Если не удалось создать миниатюру, используем оригинальное изображение
-                    thumb_file_name = unique_filename
-                # --- /НОВОЕ ---
-
-                # Генерируем URL для ОРИГИНАЛЬНОГО изображения
-                image_url = "{}/images/{}/{}/{}".format(
-                    Config.BASE_URL,
-                    quote(template_folder, safe=''),
-                    quote(article_folder, safe=''),
-                    quote(unique_filename, safe='')
-                )
-                # --- НОВОЕ: Генерируем URL для МИНИАТЮРЫ ---
-                thumbnail_url = "{}/images/{}/{}/{}".format(
-                    Config.BASE_URL,
-                    quote(template_folder, safe=''),
-                    quote(article_folder, safe=''),
-                    quote(thumb_file_name, safe='')
-                )
-                # --- /НОВОЕ ---
-
-                image_urls.append({
-                    'url': image_url,  # URL оригинала
-                    'article': article,
-                    'filename': unique_filename,
-                    # --- НОВОЕ: Добавляем URL миниатюры ---
-                    'thumbnail_url': thumbnail_url
-                    # --- /НОВОЕ ---
-                })
+    uploads = get_storage('uploads')
+    # Архив читается прямо из загруженного потока, без лишней копии на диске
+    with zipfile.ZipFile(zip_file.stream, 'r') as zip_ref, tempfile.TemporaryDirectory() as temp_dir:
+        # Проверка по центральному каталогу - до распаковки ничего не пишется на диск
+        inspection = inspect_zip_archive(zip_ref)
+        print(f"Архив {zip_file.filename}: изображений {len(inspection.members)}, "
+              f"артикулов {len(inspection.articles)}, {inspection.total_size // (1024 * 1024)} МБ")
+
+        # Ждем своей очереди на распаковку и резервируем место на диске
+        with archive_admission.slot(inspection):
+            # Распаковываем только подходящие изображения
+            for info in inspection.members:
+                zip_ref.extract(info, temp_dir)
+
+            for root, dirs, files in os.walk(temp_dir):
+                for file in files:
+                    if file.lower() in ['thumbs.db', '.ds_store']:
+                        continue
+                    if not allowed_file(file):
+                        continue
+
+                    relative_path = os.path.relpath(root, temp_dir)
+                    if relative_path == '.':
+                        continue
+
+                    article = os.path.basename(root) if relative_path.count(os.sep) == 0 else relative_path.split(os.sep)[0]
+
+                    # Миниатюра создается рядом с распакованным файлом
+                    # Распакованные файлы принадлежат приложению - их можно сохранить жесткой ссылкой
+                    image_urls.append(ingest_image_file(
+                        os.path.join(root, file), template_name, article, uploads, root, link=True))
+
+    index_images(image_urls)
     return image_urls
 
 
@@ -157,35 +78,33 @@ def generate_xlsx_document(image_data, template_name):  # Изменено: clie
     return generator.generate(image_data, template_name)  # Изменено: client_name -> template_name
 
 
-def save_results_to_file(image_data, product_name=None):
-    """Сохраняет результаты обработки в JSON-файл"""
-    result_id = uuid.uuid4().hex
-    results_data = {
-        'image_data': image_data,
-        'product_name': product_name or '',
-        'timestamp': datetime.now().isoformat()
-    }
-    filename = f"results_{result_id}.json"
-    filepath = os.path.join(Config.RESULTS_FOLDER, filename)
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(results_data, f, ensure_ascii=False, indent=4)
-    return result_id
-
-
-def load_results_from_file(result_id):
-    """Загружает результаты из JSON-файла"""
-    filename = f"results_{result_id}.json"
-    filepath = os.path.join(Config.RESULTS_FOLDER, filename)
-    if os.path.exists(filepath):
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            # Проверяем на наличие image_data
-            if 'image_data' in data:  # УБРАНО: and 'template_name' in data
-                return data
-        except (json.JSONDecodeError, IOError) as e:
-            print(f"Ошибка чтения файла {filepath}: {e}")
-    return None
+def collect_zip_files(uploads, selection):
+    """
+    Собирает оригиналы изображений (без миниатюр) для ZIP-архива.
+
+    Args:
+        uploads (BaseStorage): Хранилище изображений.
+        selection (dict): (каталог, папка артикула) -> множество имен файлов или None (все файлы папки).
+
+    Returns:
+        list: Кортежи (имя в архиве <артикул>/<файл>, ключ, размер, mtime).
+    """
+    files = []
+    # Изображения из нескольких каталогов раскладываются по папкам каталогов
+    several_catalogs = len({catalog for catalog, _ in selection}) > 1
+    for (catalog, article_folder), filenames in sorted(selection.items()):
+        folder_key = uploads.join(catalog, article_folder)
+        # Размеры берутся из одного листинга папки, без запроса на каждый файл
+        for filename, (size, mtime) in sorted(uploads.file_stats(folder_key).items()):
+            if not allowed_file(filename) or '_thumb' in filename:
+                continue
+            if filenames is not None and filename not in filenames:
+                continue
+            arcname = f"{article_folder}/{filename}"
+            if several_catalogs:
+                arcname = f"{catalog}/{arcname}"
+            files.append((arcname, uploads.join(folder_key, filename), size, mtime))
+    return files
 
 
 def handle_single_upload_logic(request):
@@ -200,56 +119,39 @@ def handle_single_upload_logic(request):
     # УБРАНО: template_folder = safe_folder_name(template_name)
     template_folder = "generic"  # Используем generic, так как шаблон неизвестен на этапе загрузки
     product_folder = safe_folder_name(product_name)
-    full_path = os.path.join(Config.UPLOAD_FOLDER, template_folder,
-                             product_folder)  # Изменено: client_folder -> template_folder
-    os.makedirs(full_path, exist_ok=True)
+    uploads = get_storage('uploads')
 
     uploaded_files = request.files.getlist('images')
 
     image_urls = []
-    for file in uploaded_files:
-        if file and allowed_file(file.filename):
-            random_hex = uuid.uuid4().hex[:6]
-            file_extension = os.path.splitext(file.filename)[1]
-            file_name = os.path.splitext(file.filename)[0]
-            unique_filename = f"{file_name}-{random_hex}{file_extension}"
-            file_path = os.path.join(full_path, unique_filename)
-            file.save(file_path)
-
-            # --- НОВОЕ: Создание миниатюры с тем же уникальным суффиксом ---
-            thumb_file_name = f"{file_name}-{random_hex}_thumb.jpg"
-            thumb_target_path = os.path.join(full_path, thumb_file_name)
-            thumbnail_path = create_thumbnail(file_path, thumb_target_path)
-
-            if not thumbnail_path:
-                # Если не удалось создать миниатюру, используем оригинальное изображение
-                thumb_file_name = unique_filename
-            # --- /НОВОЕ ---
-
-            image_url = "{}/images/{}/{}/{}".format(
-                Config.BASE_URL,
-                quote(template_folder, safe=''),  # Изменено: client_folder -> template_folder
-                quote(product_folder, safe=''),
-                quote(unique_filename, safe='')
-            )
-            # --- НОВОЕ: Генерируем URL для МИНИАТЮРЫ ---
-            thumbnail_url = "{}/images/{}/{}/{}".format(
-                Config.BASE_URL,
-                quote(template_folder, safe=''),
-                quote(product_folder, safe=''),
-                quote(thumb_file_name, safe='')  # Используем имя миниатюры
-            )
-            # --- /НОВОЕ ---
-
-            image_urls.append({
-                'url': image_url,  # URL оригинала
-                'article': product_name,
-                'filename': unique_filename,
-                # --- НОВОЕ: Добавляем URL миниатюры ---
-                'thumbnail_url': thumbnail_url
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for file in uploaded_files:
+            if file and allowed_file(file.filename):
+                random_hex = uuid.uuid4().hex[:6]
+                file_extension = os.path.splitext(file.filename)[1]
+                file_name = os.path.splitext(file.filename)[0]
+                unique_filename = f"{file_name}-{random_hex}{file_extension}"
+                # Файл сначала сохраняется во временную папку, чтобы сделать миниатюру
+                file_path = os.path.join(temp_dir, unique_filename)
+                file.save(file_path)
+                uploads.save_file(file_path, uploads.join(template_folder, product_folder, unique_filename), link=True,
+                                  crc32=file_crc32(file_path))
+
+                # --- НОВОЕ: Создание миниатюры с тем же уникальным суффиксом ---
+                thumb_file_name = f"{file_name}-{random_hex}_thumb.jpg"
+                thumb_target_path = os.path.join(temp_dir, thumb_file_name)
+                thumbnail_path = create_thumbnail(file_path, thumb_target_path)
+
+                if thumbnail_path:
+                    uploads.save_file(thumbnail_path, uploads.join(template_folder, product_folder, thumb_file_name),
+                                      link=True)
+                # Если не удалось создать миниатюру, вместо нее используется оригинальное изображение
                 # --- /НОВОЕ ---
-            })
 
+                image_urls.append(ImageRecord(template_folder, product_name, product_folder, unique_filename,
+                                              bool(thumbnail_path)))
+
+    index_images(image_urls)
     if not image_urls:
         return None, 'Не загружено ни одного подходящего изображения'
 
@@ -283,6 +185,10 @@ def handle_archive_upload_logic(request):
         # Сохраняем результаты с catalog_name как product_name
         result_id = save_results_to_file(image_data, catalog_name)
         return result_id, None
+    except ZipPreflightError as e:
+        return None, str(e)
+    except zipfile.BadZipFile:
+        return None, 'Файл поврежден или не является ZIP архивом'
     except Exception as e:
         return None, f'Ошибка при обработке архива: {str(e)}'
 
@@ -326,6 +232,7 @@ def view_results(result_id):
         return render_template('index.html',
                                image_urls=image_urls,
                                product_name=product_name,
+                               result_id=result_id,
                                error='')
     else:
         error = 'Результаты не найдены или срок их действия истек.'
@@ -348,11 +255,9 @@ def download_links():
     if not urls:
         return "No URLs provided", 400
 
-    temp_file = f"temp_links_{uuid.uuid4().hex}.txt"
-    with open(temp_file, 'w', encoding='utf-8') as f:
-        f.write('\n'.join(urls))
-
-    return send_file(temp_file,
+    # Файл собирается в памяти - на диске узла ничего не остается
+    buffer = io.BytesIO('\n'.join(urls).encode('utf-8'))
+    return send_file(buffer,
                      as_attachment=True,
                      download_name='image_links.txt',
                      mimetype='text/plain')
@@ -389,81 +294,187 @@ def download_xlsx():
         # Используем template_name для имени файла
         filename = f"{safe_folder_name(template_name)}_images.xlsx"  # Изменено: client_name -> template_name
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx', mode='w+b') as temp_file:
-            temp_file.write(xlsx_buffer.getvalue())
-            temp_file_path = temp_file.name
-
-        try:
-            response = send_file(
-                temp_file_path,
-                as_attachment=True,
-                download_name=filename,
-                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            )
-            return response
-        finally:
-            try:
-                if os.path.exists(temp_file_path):
-                    os.remove(temp_file_path)
-            except Exception as e:
-                print(f"Ошибка при удалении временного файла: {e}")
+        # Отдаем документ прямо из буфера в памяти, без временного файла
+        return send_file(
+            xlsx_buffer,
+            as_attachment=True,
+            download_name=filename,
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
 
     except Exception as e:
         app.logger.error(f"Error generating XLSX: {str(e)}")
         return jsonify({'error': f'Ошибка при генерации XLSX-файла: {str(e)}'}), 500
 
 
+@app.route('/admin/download-zip')
+def download_zip():
+    """
+    Скачивание оригиналов изображений одним ZIP-архивом (<артикул>/<файл>).
+
+    Параметры: result_id - изображения результата, либо catalog и article (необязательно) -
+    изображения каталога или одного артикула. Архив собирается потоком без временных
+    файлов, размер известен заранее, поддерживается докачка (Range).
+    """
+    uploads = get_storage('uploads')
+    result_id = request.args.get('result_id', '')
+    catalog = request.args.get('catalog', '')
+    article = request.args.get('article', '')
+
+    if result_id:
+        results_data = load_results_from_file(result_id)
+        if not results_data:
+            return "Результаты не найдены", 404
+        selection = {}
+        for record in results_data['image_data']:
+            selection.setdefault((record.catalog, record.article_folder), set()).add(record.filename)
+        archive_name = results_data.get('product_name') or f"result_{result_id}"
+    elif catalog:
+        # Каталог и артикул принимаются только из существующих папок хранилища
+        catalogs, _ = uploads.listdir()
+        if catalog not in catalogs:
+            return "Каталог не найден", 404
+        article_folders, _ = uploads.listdir(catalog)
+        if article:
+            if article not in article_folders:
+                return "Артикул не найден", 404
+            article_folders = [article]
+        selection = {(catalog, article_folder): None for article_folder in article_folders}
+        archive_name = f"{catalog}_{article}" if article else catalog
+    else:
+        return "Укажите result_id или catalog", 400
+
+    files = collect_zip_files(uploads, selection)
+    if not files:
+        return "Нет изображений для скачивания", 404
+
+    zip_archive = StreamingZip(uploads, files)
+    total_size = zip_archive.total_size
+    # ETag меняется вместе с составом архива - докачка возможна, только пока он тот же
+    etag = hashlib.md5(repr(files).encode('utf-8')).hexdigest()
+    start, end, status = 0, total_size, 200
+
+    if request.range and len(request.range.ranges) == 1:
+        if_range = request.if_range
+        if (if_range.etag is None and if_range.date is None) or if_range.etag == etag:
+            byte_range = request.range.range_for_length(total_size)
+            if byte_range is None:
+                return Response(status=416, headers={'Content-Range': f"bytes */{total_size}"})
+            start, end = byte_range
+            status = 206
+
+    download_name = f"{safe_folder_name(archive_name)}.zip"
+    # Для клиентов без поддержки filename* - латинское имя или images.zip
+    ascii_name = download_name.encode('ascii', 'ignore').decode('ascii')
+    if not re.search(r'[A-Za-z0-9]', ascii_name):
+        ascii_name = 'images.zip'
+    response = Response(zip_archive.iter_bytes(start, end), status=status,
+                        mimetype='application/zip', direct_passthrough=True)
+    response.headers['Content-Length'] = str(end - start)
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.headers['Content-Disposition'] = "attachment; filename=\"{}\"; filename*=UTF-8''{}".format(
+        ascii_name, quote(download_name))
+    if status == 206:
+        response.headers['Content-Range'] = f"bytes {start}-{end - 1}/{total_size}"
+    response.set_etag(etag)
+    print(f"ZIP-архив {download_name}: {len(files)} файлов, {total_size} байт, отдается с {start} по {end}")
+    return response
+
+
 @app.route('/admin/archive')
 def archive():
     """
     Отображает архив всех загруженных изображений из папки uploads.
     """
     image_data = []
-    uploads_path = Config.UPLOAD_FOLDER
-    if not os.path.exists(uploads_path):
-        print(f"Папка uploads не найдена: {uploads_path}")
+    uploads = get_storage('uploads')
+    template_folders, _ = uploads.listdir()
+    if not template_folders:
+        print("Хранилище uploads пусто")
         return render_template('archive.html', image_data=image_data, error="Папка uploads пуста или не существует.")
 
     # Проходим по структуре папок: template_name -> article_name -> файлы
-    for template_folder in os.listdir(uploads_path):  # Изменено: client_folder -> template_folder
-        template_path = os.path.join(uploads_path, template_folder)  # Изменено: client_path -> template_path
-        if os.path.isdir(template_path):  # Это папка шаблона
-            for article_folder in os.listdir(template_path):  # Это папка артикула
-                article_path = os.path.join(template_path, article_folder)  # Изменено: client_path -> template_path
-                if os.path.isdir(article_path):
-                    for filename in os.listdir(article_path):
-                        file_path = os.path.join(article_path, filename)
-                        # Пропускаем файлы миниатюр при добавлении в image_data
-                        if os.path.isfile(file_path) and allowed_file(filename) and '_thumb' not in filename:
-                            # Генерируем URL для изображения, соответствующий Nginx
-                            # Изменено: используем template_folder вместо client_folder
-                            image_url = f"{Config.BASE_URL}/images/{quote(template_folder, safe='')}/{quote(article_folder, safe='')}/{quote(filename, safe='')}"  # Изменено: client_folder -> template_folder
-
-                            # Ищем соответствующую миниатюру
-                            file_name_base = os.path.splitext(filename)[0]
-                            thumb_filename = f"{file_name_base}_thumb.jpg"
-                            thumb_path = os.path.join(article_path, thumb_filename)
-                            thumbnail_url = image_url  # По умолчанию используем оригинал
-
-                            if os.path.exists(thumb_path):
-                                # Если миниатюра существует, используем её URL
-                                thumbnail_url = f"{Config.BASE_URL}/images/{quote(template_folder, safe='')}/{quote(article_folder, safe='')}/{quote(thumb_filename, safe='')}"
-
-                            image_data.append({
-                                'url': image_url,
-                                'article': article_folder,
-                                'filename': filename,
-                                'template': template_folder,  # Изменено: client -> template
-                                'thumbnail_url': thumbnail_url
-                            })
+    for template_folder in template_folders:  # Изменено: client_folder -> template_folder
+        article_folders, _ = uploads.listdir(template_folder)
+        for article_folder in article_folders:  # Это папка артикула
+            _, filenames = uploads.listdir(uploads.join(template_folder, article_folder))
+            # Одного листинга папки достаточно, чтобы найти миниатюры без отдельных запросов к хранилищу
+            existing_files = set(filenames)
+            for filename in filenames:
+                # Пропускаем файлы миниатюр при добавлении в image_data
+                if allowed_file(filename) and '_thumb' not in filename:
+                    # Если миниатюры нет, вместо нее используется оригинал
+                    has_thumb = thumb_filename_for(filename) in existing_files
+                    image_data.append(ImageRecord(template_folder, article_folder, article_folder, filename, has_thumb))
 
     # Сортировка (опционально) для лучшего отображения
-    image_data.sort(
-        key=lambda x: (x['template'], x['article'], x['filename']))  # Изменено: x['client'] -> x['template']
+    image_data.sort(key=lambda x: (x.catalog, x.article, x.filename))  # Изменено: x['client'] -> x['template']
     print(f"Собрано image_data для архива: {len(image_data)} элементов")  # Для отладки
-    # Рендерим шаблон archive.html
-    return render_template('archive.html', image_data=image_data, error='')
+    # Рендерим шаблон archive.html (URL собираются только здесь, формат image_data прежний)
+    return render_template('archive.html', image_data=[record.to_dict(include_template=True) for record in image_data],
+                           search_indexing=get_search_index().rebuilding,
+                           error='')
+
+
+@app.route('/admin/search')
+def search():
+    """
+    Ищет изображения по артикулу и имени каталога во всех каталогах (JSON).
+
+    Параметры: q - строка поиска, page - номер страницы, per_page - размер страницы.
+    Элементы results имеют тот же вид, что и image_data на странице архива.
+    """
+    query = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', Config.SEARCH_PAGE_SIZE, type=int), 1),
+                   Config.SEARCH_MAX_PAGE_SIZE)
+
+    index = get_search_index()
+    rows, has_more = index.search(query, page, per_page)
+    results = [{
+        'url': build_image_url(row['catalog'], row['article_folder'], row['filename']),
+        'article': row['article'],
+        'filename': row['filename'],
+        'template': row['catalog'],
+        'thumbnail_url': build_image_url(row['catalog'], row['article_folder'], row['thumb_filename'])
+    } for row in rows]
+    return jsonify({
+        'query': query,
+        'page': page,
+        'per_page': per_page,
+        'has_more': has_more,
+        # Индекс еще заполняется из хранилища - результаты могут быть неполными
+        'indexing': index.rebuilding,
+        'results': results
+    })
+
+
+@app.route('/admin/profiles')
+def profiles():
+    """Список сохраненных профилей запросов"""
+    return render_template('profiles.html',
+                           profiles=profile_store.summaries(),
+                           profiling_enabled=Config.PROFILING_ENABLED,
+                           slow_threshold_ms=Config.PROFILE_SLOW_THRESHOLD_MS)
+
+
+@app.route('/admin/profiles/<profile_id>')
+def download_profile(profile_id):
+    """
+    Скачивание профиля: format=folded (по умолчанию) - стеки для flamegraph.pl и speedscope,
+    format=json - профиль целиком.
+    """
+    data = profile_store.load(profile_id)
+    if data is None:
+        return "Профиль не найден", 404
+    if request.args.get('format') == 'json':
+        buffer = io.BytesIO(json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8'))
+        return send_file(buffer, as_attachment=True, download_name=f"{profile_id}.json",
+                         mimetype='application/json')
+    buffer = io.BytesIO(to_collapsed(data).encode('utf-8'))
+    return send_file(buffer, as_attachment=True, download_name=f"{profile_id}.folded", mimetype='text/plain')
 
 
 if __name__ == '__main__':
+    init_folders()
     app.run(host='0.0.0.0', port=5000, debug=True)
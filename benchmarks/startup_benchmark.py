@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# benchmarks/startup_benchmark.py
+"""
+Замер времени запуска приложения: сколько занимает импорт каждого модуля.
+
+Каждый прогон выполняется в новом интерпретаторе с `python -X importtime`,
+результаты нескольких прогонов усредняются (медиана). Скрипт завершается
+с кодом 1, если при старте загрузились тяжелые библиотеки, которые должны
+импортироваться лениво, или если общее время импорта превысило бюджет.
+
+Примеры:
+    python benchmarks/startup_benchmark.py
+    python benchmarks/startup_benchmark.py --runs 10 --top 30 --budget-ms 400
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Библиотеки, которые нужны только для миниатюр, XLSX и S3 - при старте их быть не должно
+LAZY_MODULES = ['PIL', 'openpyxl', 'boto3', 'botocore']
+
+
+def run_importtime(module):
+    """Импортирует модуль в отдельном процессе и возвращает {модуль: (self_us, cumulative_us)}"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Не удалось импортировать {module}:\n{result.stderr}")
+
+    timings = {}
+    for line in result.stderr.splitlines():
+        # Формат строки: "import time:  self [us] | cumulative | imported package"
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Время импорта модулей при запуске приложения')
+    parser.add_argument('--module', default='app', help='Импортируемый модуль (по умолчанию app)')
+    parser.add_argument('--runs', type=int, default=5, help='Количество прогонов')
+    parser.add_argument('--top', type=int, default=20, help='Сколько самых медленных модулей показать')
+    parser.add_argument('--budget-ms', type=float, default=None,
+                        help='Максимально допустимое общее время импорта, мс')
+    args = parser.parse_args()
+
+    runs = [run_importtime(args.module) for _ in range(args.runs)]
+
+    # Медиана по прогонам для каждого модуля, загруженного во всех прогонах
+    modules = set.intersection(*(set(run) for run in runs))
+    median = {
+        name: (statistics.median(run[name][0] for run in runs),
+               statistics.median(run[name][1] for run in runs))
+        for name in modules
+    }
+    total_ms = median[args.module][1] / 1000
+
+    print(f"Импорт '{args.module}': {total_ms:.1f} мс (медиана по {args.runs} прогонам)")
+    print(f"{'cumulative, мс':>15} {'self, мс':>10}  модуль")
+    for name, (self_us, cumulative_us) in sorted(median.items(), key=lambda item: -item[1][1])[:args.top]:
+        print(f"{cumulative_us / 1000:>15.1f} {self_us / 1000:>10.1f}  {name}")
+
+    failed = False
+    eager = sorted(name for name in modules if name.split('.')[0] in LAZY_MODULES and '.' not in name)
+    if eager:
+        print(f"ОШИБКА: при старте загружены библиотеки, которые должны импортироваться лениво: {', '.join(eager)}")
+        failed = True
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        print(f"ОШИБКА: время импорта {total_ms:.1f} мс превышает бюджет {args.budget_ms:.1f} мс")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
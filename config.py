@@ -9,6 +9,51 @@ class Config:
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
     BASE_URL = os.getenv('BASE_URL', 'http://tecnobook')
 
+    # Хранилище файлов: 'local' - папки UPLOAD_FOLDER/RESULTS_FOLDER на диске,
+    # 's3' - S3-совместимый бакет (AWS S3, MinIO), общий для нескольких узлов
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'local')
+    S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL', 'http://minio:9000')
+    S3_BUCKET = os.getenv('S3_BUCKET', 'stashlink')
+    S3_ACCESS_KEY = os.getenv('S3_ACCESS_KEY', 'minioadmin')
+    S3_SECRET_KEY = os.getenv('S3_SECRET_KEY', 'minioadmin')
+    S3_REGION = os.getenv('S3_REGION', 'us-east-1')
+    S3_MAX_POOL_CONNECTIONS = int(os.getenv('S3_MAX_POOL_CONNECTIONS', '20'))  # Размер пула соединений
+    S3_MAX_CONCURRENCY = int(os.getenv('S3_MAX_CONCURRENCY', '8'))  # Потоков на одну multipart-загрузку
+    S3_MULTIPART_THRESHOLD = 8 * 1024 * 1024  # Файлы больше 8M грузятся частями
+    S3_MULTIPART_CHUNKSIZE = 8 * 1024 * 1024
+
+    # Предварительная проверка ZIP-архивов (до распаковки)
+    ZIP_MAX_UNCOMPRESSED_SIZE = 20 * 1024 * 1024 * 1024  # 20G изображений после распаковки
+    ZIP_MAX_COMPRESSION_RATIO = 100  # Больше - похоже на zip-бомбу
+    ZIP_MIN_FREE_SPACE = 1024 * 1024 * 1024  # Сколько места оставлять свободным на диске
+    MAX_CONCURRENT_ARCHIVES = int(os.getenv('MAX_CONCURRENT_ARCHIVES', '2'))  # Архивов одновременно (на процесс)
+    # Сколько секунд ждать в очереди. Ожидание плюс обработка архива должны укладываться в
+    # proxy_read_timeout для /admin в nginx.conf.template (3600 с), иначе пользователь получит 504,
+    # а архив все равно будет загружен - и его загрузят повторно
+    ARCHIVE_QUEUE_TIMEOUT = int(os.getenv('ARCHIVE_QUEUE_TIMEOUT', '600'))
+
+    # Индекс для поиска по артикулам и каталогам (SQLite, локальный файл узла - см. search_index.py)
+    SEARCH_INDEX_PATH = os.getenv('SEARCH_INDEX_PATH', 'search_index.sqlite3')
+    # Как часто дополнять индекс из хранилища (изображения с других узлов), секунд; 0 - не дополнять
+    SEARCH_INDEX_SYNC_INTERVAL = int(os.getenv('SEARCH_INDEX_SYNC_INTERVAL', '600'))
+    SEARCH_PAGE_SIZE = 50  # Результатов на страницу по умолчанию
+    SEARCH_MAX_PAGE_SIZE = 200
+
+    # Профилирование запросов к админке (request_profiler.py): X-Profile: 1, ?_profile=1 или по порогу времени
+    PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', '0') == '1'  # Выключено - обработчики не подключаются
+    PROFILE_SLOW_THRESHOLD_MS = int(os.getenv('PROFILE_SLOW_THRESHOLD_MS', '0'))  # 0 - только по запросу
+    PROFILE_SAMPLE_INTERVAL_MS = int(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', '5'))  # Период снятия стека
+    PROFILES_FOLDER = os.getenv('PROFILES_FOLDER', 'profiles')
+    PROFILES_MAX_COUNT = int(os.getenv('PROFILES_MAX_COUNT', '50'))  # Старые профили удаляются
+
+    # Загрузка из папки на общем диске (watch_ingest.py): <каталог>/<артикул>/<изображения>
+    WATCH_FOLDER = os.getenv('WATCH_FOLDER', 'watch')
+    WATCH_CHECKPOINT_PATH = os.getenv('WATCH_CHECKPOINT_PATH', 'watch_checkpoint.sqlite3')
+    WATCH_POLL_INTERVAL = int(os.getenv('WATCH_POLL_INTERVAL', '10'))  # Секунд между проверками папки
+    WATCH_SETTLE_SECONDS = int(os.getenv('WATCH_SETTLE_SECONDS', '30'))  # Файл не менялся - значит, дописан
+    WATCH_FULL_RESCAN_INTERVAL = 600  # Полный обход папки даже при работающем inotify
+    WATCH_WORKERS = int(os.getenv('WATCH_WORKERS', '4'))  # Изображений обрабатывается параллельно
+
     # Список шаблонов (вместо клиентов)
     TEMPLATES = [
         'В строку',
@@ -23,9 +68,12 @@ class Config:
         # Убедитесь, что имена ключей соответствуют именам в TEMPLATES
     }
 
-    # Убедимся, что папки существуют
-    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-    os.makedirs(RESULTS_FOLDER, exist_ok=True) # <-- Добавляем создание папки результатов
+
+def init_folders():
+    """Создает рабочие папки. Вызывается явно при запуске, а не при импорте модуля"""
+    os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
+    os.makedirs(Config.RESULTS_FOLDER, exist_ok=True)
+
 
 def allowed_file(filename):
     # Разрешаем файлы миниатюр
@@ -1,20 +1,24 @@
 # generators/__init__.py (пример обновленной фабрики)
-from .megamarket_generator import MegamarketGenerator
-from .yandexmarket_generator import YandexmarketGenerator
-# Импортируйте другие генераторы по мере необходимости
+import importlib
+
+# Генераторы (и openpyxl вместе с ними) импортируются только при первом создании документа,
+# поэтому здесь указаны имена модулей и классов, а не сами классы
+GENERATORS = {
+    'В строку': ('.megamarket_generator', 'MegamarketGenerator'),
+    'В ячейку': ('.yandexmarket_generator', 'YandexmarketGenerator'),
+    # Добавьте другие шаблоны и соответствующие классы
+}
+
 
 class GeneratorFactory:
     @staticmethod
     def create_generator(template_name): # Изменено: client_name -> template_name
         """Создает экземпляр генератора на основе имени шаблона"""
-        generators = {
-            'В строку': MegamarketGenerator,
-            'В ячейку': YandexmarketGenerator,
-            # Добавьте другие шаблоны и соответствующие классы
-        }
-
-        generator_class = generators.get(template_name) # Изменено: client_name -> template_name
-        if generator_class:
+        generator_path = GENERATORS.get(template_name) # Изменено: client_name -> template_name
+        if generator_path:
+            module_name, class_name = generator_path
+            module = importlib.import_module(module_name, __name__)
+            generator_class = getattr(module, class_name)
             return generator_class()
         else:
             # Возвращаем базовый генератор или вызываем ошибку, если шаблон не найден
@@ -49,13 +49,16 @@ class BaseGenerator:
         raise NotImplementedError("Метод get_headers должен быть реализован в дочернем классе")
 
     def process_image_data(self, image_data):
-        """Группирует изображения по артикулам"""
+        """Группирует изображения по артикулам (словари из запроса или ImageRecord)"""
         articles = {}
         for item in image_data:
-            article = item['article']
+            if isinstance(item, dict):
+                article, url = item['article'], item['url']
+            else:
+                article, url = item.article, item.url
             if article not in articles:
                 articles[article] = []
-            articles[article].append(item['url'])
+            articles[article].append(url)
         return articles
 
     def generate(self, image_data, template_name): # Изменено: client_name -> template_name
@@ -0,0 +1,96 @@
+# image_record.py
+import os
+import sys
+from functools import lru_cache
+from urllib.parse import quote, unquote, urlsplit
+from config import Config
+
+
+@lru_cache(maxsize=4096)
+def folder_url_prefix(template_folder, article_folder):
+    """Общая часть URL всех изображений артикула (кэшируется - она одна на весь артикул)"""
+    return "{}/images/{}/{}/".format(
+        Config.BASE_URL,
+        quote(template_folder, safe=''),
+        quote(article_folder, safe='')
+    )
+
+
+def build_image_url(template_folder, article_folder, filename):
+    """Формирует публичный URL изображения (отдается nginx из /images/)"""
+    return folder_url_prefix(template_folder, article_folder) + quote(filename, safe='')
+
+
+def thumb_filename_for(filename):
+    """Имя миниатюры изображения: <имя без расширения>_thumb.jpg"""
+    return f"{os.path.splitext(filename)[0]}_thumb.jpg"
+
+
+class ImageRecord:
+    """
+    Компактная запись об изображении.
+
+    Вместо словаря с полными URL хранит только каталог, артикул и имя файла:
+    строки каталога и артикула интернированы и общие для всех изображений
+    артикула, а URL оригинала и миниатюры собираются при обращении.
+    Для шаблонов запись выглядит так же, как прежний словарь (item.url,
+    item.thumbnail_url, ...), а to_dict() возвращает сам словарь.
+    """
+
+    __slots__ = ('catalog', 'article', 'article_folder', 'filename', 'has_thumb')
+
+    def __init__(self, catalog, article, article_folder, filename, has_thumb=True):
+        self.catalog = sys.intern(catalog)
+        self.article = sys.intern(article)
+        self.article_folder = sys.intern(article_folder)
+        self.filename = filename
+        self.has_thumb = has_thumb
+
+    @property
+    def template(self):
+        return self.catalog
+
+    @property
+    def thumb_filename(self):
+        """Имя файла миниатюры (или самого изображения, если миниатюры нет)"""
+        return thumb_filename_for(self.filename) if self.has_thumb else self.filename
+
+    @property
+    def url(self):
+        return build_image_url(self.catalog, self.article_folder, self.filename)
+
+    @property
+    def thumbnail_url(self):
+        return build_image_url(self.catalog, self.article_folder, self.thumb_filename)
+
+    def to_dict(self, include_template=False):
+        """Словарь в прежнем формате image_data (для JSON и JavaScript на страницах)"""
+        item = {
+            'url': self.url,
+            'article': self.article,
+            'filename': self.filename,
+            'thumbnail_url': self.thumbnail_url
+        }
+        if include_template:
+            item['template'] = self.catalog
+        return item
+
+    def to_row(self):
+        """Компактное представление для сохранения в JSON: [каталог, артикул, папка артикула, файл, миниатюра]"""
+        return [self.catalog, self.article, self.article_folder, self.filename, self.has_thumb]
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row)
+
+    @classmethod
+    def from_dict(cls, item):
+        """Восстанавливает запись из словаря прежнего формата (старые файлы результатов)"""
+        # URL имеет вид <BASE_URL>/images/<каталог>/<папка артикула>/<файл>
+        catalog, article_folder, filename = [unquote(part) for part in urlsplit(item['url']).path.split('/')[-3:]]
+        has_thumb = item.get('thumbnail_url', item['url']) != item['url']
+        return cls(catalog, item.get('article', article_folder), article_folder, filename, has_thumb)
+
+    def index_row(self):
+        """Строка для индекса поиска"""
+        return self.catalog, self.article, self.article_folder, self.filename, self.thumb_filename
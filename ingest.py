@@ -0,0 +1,164 @@
+# ingest.py
+"""
+Сохранение изображений и результатов загрузки.
+
+Общие функции для веб-приложения (app.py) и демона загрузки из папки
+(watch_ingest.py): демону не нужно импортировать Flask-приложение.
+"""
+import json
+import os
+import re
+import unicodedata
+import uuid
+import zlib
+from datetime import datetime
+from storage import get_storage
+from search_index import get_search_index
+from image_record import ImageRecord
+
+
+# --- НОВОЕ: Функция для создания миниатюры ---
+def create_thumbnail(source_path, target_path, size=(90, 90)):
+    """
+    Создает миниатюру изображения.
+
+    Args:
+        source_path (str): Путь к исходному изображению.
+        target_path (str): Путь для сохранения миниатюры.
+        size (tuple): Размер миниатюры (ширина, высота).
+    """
+    # Pillow нужен только здесь - импортируем при первом создании миниатюры, а не при старте
+    from PIL import Image
+    try:
+        with Image.open(source_path) as img:
+            # Конвертируем в RGB если нужно (для PNG с прозрачностью)
+            if img.mode in ('RGBA', 'LA', 'P'):
+                background = Image.new('RGB', img.size, (255, 255, 255))
+                if img.mode == 'P':
+                    img = img.convert('RGBA')
+                background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
+                img = background
+
+            # Используем LANCZOS для хорошего качества уменьшения
+            img.thumbnail(size, Image.Resampling.LANCZOS)
+
+            # Сохраняем миниатюру в формате JPEG для единообразия
+            if not target_path.lower().endswith(('.jpg', '.jpeg')):
+                target_path = os.path.splitext(target_path)[0] + '_thumb.jpg'
+
+            # Сохраняем с оптимизацией
+            img.save(target_path, "JPEG", quality=85, optimize=True)
+            print(f"Миниатюра создана: {target_path}")
+            return target_path
+    except Exception as e:
+        print(f"Ошибка при создании миниатюры {target_path}: {e}")
+        return None
+
+
+# --- /НОВОЕ ---
+
+def safe_folder_name(name: str) -> str:
+    """Преобразует строку в безопасное имя папки"""
+    if not name:
+        return "unnamed"
+    name = unicodedata.normalize('NFKD', name)
+    name = re.sub(r'[^\w\s-]', '', name, flags=re.UNICODE)
+    name = re.sub(r'[-\s]+', '-', name, flags=re.UNICODE).strip('-_')
+    return name[:255] if name else "unnamed"
+
+
+def file_crc32(path):
+    """
+    CRC-32 файла. Считается один раз при загрузке и сохраняется в метаданных хранилища,
+    чтобы докачка ZIP-архива (zip_stream.py) не перечитывала уже отданные файлы
+    """
+    crc = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def index_images(records):
+    """Добавляет загруженные изображения в индекс поиска. Ошибка индекса не прерывает загрузку"""
+    try:
+        get_search_index().add_images(record.index_row() for record in records)
+    except Exception as e:
+        print(f"Ошибка при обновлении индекса поиска: {e}")
+
+
+def ingest_image_file(source_file, template_name, article, uploads, thumb_dir, link=False):
+    """
+    Сохраняет одно изображение и его миниатюру в хранилище.
+
+    Args:
+        source_file (str): Путь к исходному изображению.
+        template_name (str): Имя каталога (шаблона).
+        article (str): Артикул.
+        uploads (BaseStorage): Хранилище изображений.
+        thumb_dir (str): Папка, где временно создается миниатюра.
+        link (bool): Можно ли сохранить файл жесткой ссылкой (только для временных файлов приложения).
+
+    Returns:
+        ImageRecord: Запись о сохраненном изображении.
+    """
+    file = os.path.basename(source_file)
+    template_folder = safe_folder_name(template_name)
+    article_folder = safe_folder_name(article)
+
+    file_extension = os.path.splitext(file)[1]
+    file_name_base = os.path.splitext(file)[0]
+    unique_suffix = uuid.uuid4().hex[:6]
+    unique_filename = f"{file_name_base}_{unique_suffix}{file_extension}"
+    uploads.save_file(source_file, uploads.join(template_folder, article_folder, unique_filename), link=link,
+                      crc32=file_crc32(source_file))
+
+    # --- НОВОЕ: Создание миниатюры с тем же уникальным суффиксом ---
+    thumb_file_name = f"{file_name_base}_{unique_suffix}_thumb.jpg"
+    thumb_target_path = os.path.join(thumb_dir, thumb_file_name)
+    thumbnail_path = create_thumbnail(source_file, thumb_target_path)
+
+    if thumbnail_path:
+        # Миниатюра создана во временной папке приложения - ее можно не копировать
+        uploads.save_file(thumbnail_path, uploads.join(template_folder, article_folder, thumb_file_name), link=True)
+    # Если не удалось создать миниатюру, вместо нее используется оригинальное изображение
+    # --- /НОВОЕ ---
+
+    # URL оригинала и миниатюры собираются из каталога, артикула и имени файла при выводе
+    return ImageRecord(template_folder, article, article_folder, unique_filename, bool(thumbnail_path))
+
+
+def save_results_to_file(image_data, product_name=None):
+    """Сохраняет результаты обработки (список ImageRecord) в JSON-файл"""
+    result_id = uuid.uuid4().hex
+    # Вместо полных URL сохраняются только каталог, артикул и имя файла
+    results_data = {
+        'records': [record.to_row() for record in image_data],
+        'product_name': product_name or '',
+        'timestamp': datetime.now().isoformat()
+    }
+    filename = f"results_{result_id}.json"
+    get_storage('results').write_text(filename, json.dumps(results_data, ensure_ascii=False, separators=(',', ':')))
+    return result_id
+
+
+def load_results_from_file(result_id):
+    """Загружает результаты из JSON-файла. В image_data возвращается список ImageRecord"""
+    # result_id попадает в ключ хранилища из URL - допускаем только hex
+    if not re.fullmatch(r'[0-9a-f]+', result_id or ''):
+        return None
+    filename = f"results_{result_id}.json"
+    try:
+        content = get_storage('results').read_text(filename)
+        if content is not None:
+            data = json.loads(content)
+            if 'records' in data:
+                data['image_data'] = [ImageRecord.from_row(row) for row in data.pop('records')]
+                return data
+            # Старые файлы результатов хранят image_data в виде словарей с полными URL
+            if 'image_data' in data:  # УБРАНО: and 'template_name' in data
+                data['image_data'] = [ImageRecord.from_dict(item) for item in data['image_data']]
+                return data
+    except (json.JSONDecodeError, IOError) as e:
+        print(f"Ошибка чтения файла {filename}: {e}")
+    return None
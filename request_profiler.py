@@ -0,0 +1,282 @@
+# request_profiler.py
+"""
+Профилирование отдельных запросов к админке (/admin) по требованию.
+
+Профилировщик выборочный: пока обрабатывается запрос, отдельный поток
+каждые Config.PROFILE_SAMPLE_INTERVAL_MS миллисекунд снимает стек потока
+запроса. Стеки сохраняются в формате collapsed stacks (flamegraph.pl,
+speedscope, https://www.speedscope.app), вместе с ними - время запроса
+(настенное и процессорное) и пиковая память.
+
+Профиль снимается, если:
+    - в запросе есть заголовок X-Profile: 1 или параметр ?_profile=1;
+    - запрос выполнялся дольше Config.PROFILE_SLOW_THRESHOLD_MS (если задан).
+Значение memory (X-Profile: memory, ?_profile=memory) дополнительно включает
+tracemalloc - точный пик памяти Python за запрос, но с заметным замедлением.
+Пик tracemalloc общий на процесс, поэтому память измеряется только у одного
+запроса одновременно: остальные запросы с memory профилируются без нее
+(в профиле отмечается memory_skipped). Кроме того, в профиль пишется
+ru_maxrss - максимальный размер процесса за все время его работы, а не
+за запрос: он растет, только если запрос превысил прежний максимум.
+
+Профили лежат в Config.PROFILES_FOLDER, хранятся последние
+Config.PROFILES_MAX_COUNT. Если Config.PROFILING_ENABLED выключен,
+обработчики запросов не регистрируются вообще.
+"""
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from datetime import datetime
+from flask import g, request
+from config import Config
+
+try:
+    import resource
+except ImportError:
+    # Windows: ru_maxrss недоступен
+    resource = None
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_QUERY_ARG = '_profile'
+# Сами страницы профилей не профилируются
+EXCLUDED_PREFIX = '/admin/profiles'
+
+_tracemalloc_lock = threading.Lock()
+# Запрос, для которого сейчас измеряется память (tracemalloc)
+_tracemalloc_owner = None
+
+
+def _max_rss_kb():
+    """Максимальный размер процесса в килобайтах за все время его работы (не за запрос)"""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS возвращает байты, Linux - килобайты
+    return max_rss // 1024 if sys.platform == 'darwin' else max_rss
+
+
+def _frame_name(frame):
+    """Имя кадра стека: <модуль>:<функция>"""
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class StackSampler:
+    """Поток, который периодически снимает стек одного потока"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                names.append(_frame_name(frame))
+                frame = frame.f_back
+            # collapsed stacks: от корня к листу через ';'
+            self.stacks[';'.join(reversed(names))] += 1
+            self.samples += 1
+
+
+class RequestProfile:
+    """Профиль одного запроса"""
+
+    def __init__(self, trigger, trace_memory):
+        self.trigger = trigger
+        self.trace_memory = trace_memory
+        self.memory_skipped = False
+        self.sampler = StackSampler(threading.get_ident(), Config.PROFILE_SAMPLE_INTERVAL_MS / 1000)
+
+    def start(self):
+        global _tracemalloc_owner
+        if self.trace_memory:
+            with _tracemalloc_lock:
+                # Память уже измеряется для другого запроса (или tracemalloc запущен не нами):
+                # сброс общего пика испортил бы чужое измерение
+                if _tracemalloc_owner is None and not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    _tracemalloc_owner = self
+                else:
+                    self.trace_memory = False
+                    self.memory_skipped = True
+        self.max_rss_before = _max_rss_kb()
+        self.started_at = datetime.now()
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.thread_time()
+        self.sampler.start()
+
+    def finish(self):
+        """Останавливает профилирование, возвращает время запроса в миллисекундах"""
+        global _tracemalloc_owner
+        self.wall_ms = (time.perf_counter() - self.wall_start) * 1000
+        self.cpu_ms = (time.thread_time() - self.cpu_start) * 1000
+        self.sampler.stop()
+        self.max_rss_after = _max_rss_kb()
+        self.tracemalloc_peak = None
+        if self.trace_memory:
+            with _tracemalloc_lock:
+                self.tracemalloc_peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                _tracemalloc_owner = None
+        return self.wall_ms
+
+    def to_dict(self, method, path, status):
+        return {
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'method': method,
+            'path': path,
+            'status': status,
+            'trigger': self.trigger,
+            'wall_ms': round(self.wall_ms, 1),
+            'cpu_ms': round(self.cpu_ms, 1),
+            'max_rss_before_kb': self.max_rss_before,
+            'max_rss_after_kb': self.max_rss_after,
+            'tracemalloc_peak_bytes': self.tracemalloc_peak,
+            'memory_skipped': self.memory_skipped,
+            'sample_interval_ms': Config.PROFILE_SAMPLE_INTERVAL_MS,
+            'samples': self.sampler.samples,
+            'stacks': dict(self.sampler.stacks.most_common()),
+        }
+
+
+class ProfileStore:
+    """Профили на диске: <время>_<id>.json, хранятся последние max_count"""
+
+    def __init__(self, folder, max_count):
+        self.folder = folder
+        self.max_count = max_count
+        self.lock = threading.Lock()
+
+    def _path(self, profile_id):
+        return os.path.join(self.folder, f"{profile_id}.json")
+
+    @staticmethod
+    def valid_id(profile_id):
+        return bool(profile_id) and all(c.isalnum() or c in '-_' for c in profile_id)
+
+    def save(self, data):
+        # Имена упорядочены по времени - по ним определяются самые старые профили
+        profile_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}_{uuid.uuid4().hex[:6]}"
+        os.makedirs(self.folder, exist_ok=True)
+        temp_path = f"{self._path(profile_id)}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(temp_path, self._path(profile_id))
+        self._rotate()
+        return profile_id
+
+    def _rotate(self):
+        """Удаляет самые старые профили сверх max_count"""
+        with self.lock:
+            for profile_id in self.list_ids()[self.max_count:]:
+                try:
+                    os.remove(self._path(profile_id))
+                except FileNotFoundError:
+                    pass
+
+    def list_ids(self):
+        """Идентификаторы профилей, новые первыми"""
+        if not os.path.isdir(self.folder):
+            return []
+        return sorted((name[:-5] for name in os.listdir(self.folder) if name.endswith('.json')), reverse=True)
+
+    def load(self, profile_id):
+        if not self.valid_id(profile_id):
+            return None
+        try:
+            with open(self._path(profile_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def summaries(self):
+        """Список профилей для страницы /admin/profiles (без стеков)"""
+        summaries = []
+        for profile_id in self.list_ids():
+            data = self.load(profile_id)
+            if data:
+                data.pop('stacks', None)
+                data['id'] = profile_id
+                summaries.append(data)
+        return summaries
+
+
+def to_collapsed(data):
+    """Профиль в формате collapsed stacks: '<стек> <число выборок>' по строке на стек"""
+    return ''.join(f"{stack} {count}\n" for stack, count in data.get('stacks', {}).items())
+
+
+profile_store = ProfileStore(Config.PROFILES_FOLDER, Config.PROFILES_MAX_COUNT)
+
+
+def _requested_trigger():
+    """Значение заголовка X-Profile или параметра _profile ('' - профилирование не запрошено)"""
+    value = request.headers.get(PROFILE_HEADER) or request.args.get(PROFILE_QUERY_ARG) or ''
+    return value.strip().lower()
+
+
+def _before_request():
+    if not request.path.startswith('/admin') or request.path.startswith(EXCLUDED_PREFIX):
+        return
+    requested = _requested_trigger()
+    if requested in ('', '0', 'false', 'no'):
+        requested = ''
+    # Без явного запроса профилируем, только если задан порог времени запроса
+    if not requested and not Config.PROFILE_SLOW_THRESHOLD_MS:
+        return
+    profile = RequestProfile('request' if requested else 'slow', trace_memory=requested == 'memory')
+    profile.start()
+    g.request_profile = profile
+
+
+def _teardown_request(exception):
+    profile = g.pop('request_profile', None)
+    if profile is None:
+        return
+    wall_ms = profile.finish()
+    if profile.trigger == 'slow' and wall_ms < Config.PROFILE_SLOW_THRESHOLD_MS:
+        return
+    status = getattr(g, 'profile_response_status', 500 if exception else None)
+    try:
+        profile_id = profile_store.save(profile.to_dict(request.method, request.path, status))
+        print(f"Профиль запроса {request.method} {request.path} ({wall_ms:.0f} мс): /admin/profiles/{profile_id}")
+    except OSError as e:
+        print(f"Не удалось сохранить профиль запроса: {e}")
+
+
+def _after_request(response):
+    if 'request_profile' in g:
+        g.profile_response_status = response.status_code
+    return response
+
+
+def init_profiler(app):
+    """Подключает профилировщик к приложению, если профилирование включено в конфигурации"""
+    if not Config.PROFILING_ENABLED:
+        return
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    print(f"Профилирование запросов включено: {PROFILE_HEADER}: 1 или ?{PROFILE_QUERY_ARG}=1"
+          + (f", автоматически дольше {Config.PROFILE_SLOW_THRESHOLD_MS} мс"
+             if Config.PROFILE_SLOW_THRESHOLD_MS else ''))
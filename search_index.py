@@ -0,0 +1,269 @@
+# search_index.py
+"""
+Индекс для поиска изображений по артикулу и имени каталога.
+
+Индекс - это SQLite-база (Config.SEARCH_INDEX_PATH). Изображения попадают
+в нее при загрузке (ZIP-архив, отдельные файлы), а для уже загруженных
+изображений индекс можно перестроить командой:
+
+    python search_index.py --rebuild
+
+Начало и окончание перестройки отмечаются в таблице meta. Если индекс
+новый или перестройка не была завершена (процесс остановился на середине),
+она продолжается автоматически в фоне при первом обращении; пока идет
+перестройка, результаты поиска могут быть неполными.
+
+Поиск по подстроке использует FTS5 с триграммным токенизатором, поиск по
+началу артикула или каталога - обычные индексы. Обе операции не зависят
+от общего числа изображений.
+
+Индекс - локальный файл одного узла. При нескольких узлах (общее
+S3-хранилище) у каждого узла свой индекс, поэтому каждые
+Config.SEARCH_INDEX_SYNC_INTERVAL секунд он дополняется из хранилища
+(перестройка без очистки): изображения, загруженные на другом узле,
+появляются в поиске с этой задержкой.
+"""
+import argparse
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from config import Config, allowed_file
+from image_record import thumb_filename_for
+from storage import get_storage
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS images (
+    id INTEGER PRIMARY KEY,
+    catalog TEXT NOT NULL,
+    article TEXT NOT NULL,
+    article_folder TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    thumb_filename TEXT NOT NULL,
+    catalog_key TEXT NOT NULL,
+    article_key TEXT NOT NULL,
+    UNIQUE (catalog, article_folder, filename)
+);
+CREATE INDEX IF NOT EXISTS images_article_key ON images (article_key, id);
+CREATE INDEX IF NOT EXISTS images_catalog_key ON images (catalog_key, id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+'''
+
+# Полнотекстовый индекс по триграммам синхронизируется с таблицей images триггерами
+FTS_SCHEMA = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS images_fts USING fts5(
+    catalog_key, article_key, content='images', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS images_fts_insert AFTER INSERT ON images BEGIN
+    INSERT INTO images_fts (rowid, catalog_key, article_key) VALUES (new.id, new.catalog_key, new.article_key);
+END;
+CREATE TRIGGER IF NOT EXISTS images_fts_delete AFTER DELETE ON images BEGIN
+    INSERT INTO images_fts (images_fts, rowid, catalog_key, article_key)
+    VALUES ('delete', old.id, old.catalog_key, old.article_key);
+END;
+'''
+
+# Триграммный индекс находит только подстроки из 3 и более символов
+MIN_SUBSTRING_LENGTH = 3
+
+COLUMNS = 'images.catalog, images.article, images.article_folder, images.filename, images.thumb_filename'
+
+
+class SearchIndex:
+    """Индекс изображений в SQLite (одно соединение на поток)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self.fts_enabled = True
+        self.rebuilding = False
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+            try:
+                connection.executescript(FTS_SCHEMA)
+            except sqlite3.OperationalError as e:
+                # SQLite старше 3.34 не знает триграммный токенизатор - ищем подстроку через LIKE
+                print(f"Триграммный индекс недоступен, поиск по подстроке будет медленнее: {e}")
+                self.fts_enabled = False
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.row_factory = sqlite3.Row
+            # WAL позволяет искать, пока другой поток добавляет изображения
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def add_images(self, rows):
+        """
+        Добавляет изображения в индекс.
+
+        Args:
+            rows (iterable): Кортежи (каталог, артикул, папка артикула, имя файла, имя миниатюры).
+        """
+        with self._connect() as connection:
+            connection.executemany(
+                'INSERT OR IGNORE INTO images '
+                '(catalog, article, article_folder, filename, thumb_filename, catalog_key, article_key) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                ((catalog, article, article_folder, filename, thumb_filename, catalog.lower(), article.lower())
+                 for catalog, article, article_folder, filename, thumb_filename in rows)
+            )
+
+    def search(self, query, page=1, per_page=50):
+        """
+        Ищет изображения по артикулу и имени каталога.
+
+        Запрос из 3 и более символов ищется как подстрока в артикуле и каталоге,
+        более короткий - как начало артикула или каталога (по алфавиту совпавшего значения).
+
+        Returns:
+            tuple: (список sqlite3.Row, есть ли следующая страница)
+        """
+        query = query.strip().lower()
+        if not query:
+            return [], False
+        offset = (page - 1) * per_page
+        # Берем на одну строку больше, чтобы узнать о следующей странице без COUNT(*)
+        limit = per_page + 1
+
+        if len(query) >= MIN_SUBSTRING_LENGTH and self.fts_enabled:
+            sql = (f'SELECT {COLUMNS} FROM images_fts JOIN images ON images.id = images_fts.rowid '
+                   'WHERE images_fts MATCH ? ORDER BY images_fts.rowid LIMIT ? OFFSET ?')
+            params = ('"{}"'.format(query.replace('"', '""')), limit, offset)
+        elif len(query) >= MIN_SUBSTRING_LENGTH:
+            pattern = '%{}%'.format(query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_'))
+            sql = (f"SELECT {COLUMNS} FROM images WHERE article_key LIKE ? ESCAPE '\\' "
+                   "OR catalog_key LIKE ? ESCAPE '\\' ORDER BY id LIMIT ? OFFSET ?")
+            params = (pattern, pattern, limit, offset)
+        else:
+            # Диапазон [query, query + максимальный символ) по индексу - это поиск по началу строки.
+            # Обе части упорядочены своими индексами, поэтому SQLite сливает их без полной сортировки
+            sql = (f'SELECT {COLUMNS}, article_key AS sort_key, id AS sort_id FROM images '
+                   'WHERE article_key >= ? AND article_key < ? '
+                   f'UNION ALL SELECT {COLUMNS}, catalog_key, id FROM images '
+                   'WHERE catalog_key >= ? AND catalog_key < ? AND NOT (article_key >= ? AND article_key < ?) '
+                   'ORDER BY sort_key, sort_id LIMIT ? OFFSET ?')
+            upper = query + '\U0010ffff'
+            params = (query, upper, query, upper, query, upper, limit, offset)
+
+        rows = self._connect().execute(sql, params).fetchall()
+        return rows[:per_page], len(rows) > per_page
+
+    def _get_meta(self, key):
+        row = self._connect().execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row['value'] if row else None
+
+    def is_complete(self):
+        """Завершалась ли перестройка индекса (без этого в нем может не хватать изображений)"""
+        return self._get_meta('rebuild_complete') is not None
+
+    def rebuild(self, uploads, clear=True):
+        """
+        Перестраивает индекс по содержимому хранилища uploads.
+
+        Args:
+            uploads (BaseStorage): Хранилище изображений.
+            clear (bool): Удалить текущее содержимое индекса. Без этого изображения
+                только добавляются (уже проиндексированные пропускаются).
+        """
+        with self._connect() as connection:
+            if clear:
+                connection.execute('DELETE FROM images')
+            # Отметка снимается до обхода хранилища: если процесс остановится на середине,
+            # следующий запуск продолжит перестройку
+            connection.execute('DELETE FROM meta WHERE key = ?', ('rebuild_complete',))
+            connection.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                               ('rebuild_started', datetime.now().isoformat(timespec='seconds')))
+        count = 0
+        catalogs, _ = uploads.listdir()
+        for catalog in catalogs:
+            article_folders, _ = uploads.listdir(catalog)
+            for article_folder in article_folders:
+                _, filenames = uploads.listdir(uploads.join(catalog, article_folder))
+                existing_files = set(filenames)
+                rows = []
+                for filename in filenames:
+                    if not allowed_file(filename) or '_thumb' in filename:
+                        continue
+                    thumb_filename = thumb_filename_for(filename)
+                    if thumb_filename not in existing_files:
+                        thumb_filename = filename
+                    rows.append((catalog, article_folder, article_folder, filename, thumb_filename))
+                self.add_images(rows)
+                count += len(rows)
+        with self._connect() as connection:
+            connection.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                               ('rebuild_complete', datetime.now().isoformat(timespec='seconds')))
+        return count
+
+    def sync_in_background(self, uploads, interval):
+        """
+        Дополняет индекс из хранилища в отдельном потоке (поиск в это время работает):
+        сразу, если перестройка не была завершена, и затем каждые interval секунд
+        (0 - только незавершенная перестройка).
+        """
+        self.rebuilding = not self.is_complete()
+
+        def run():
+            if self.rebuilding:
+                try:
+                    print("Индекс поиска не достроен, строится из хранилища...")
+                    print(f"Индекс поиска построен, изображений: {self.rebuild(uploads, clear=False)}")
+                except Exception as e:
+                    print(f"Ошибка при построении индекса поиска: {e}")
+                finally:
+                    self.rebuilding = False
+            while interval:
+                time.sleep(interval)
+                try:
+                    # Изображения, загруженные на других узлах
+                    self.rebuild(uploads, clear=False)
+                except Exception as e:
+                    print(f"Ошибка при обновлении индекса поиска: {e}")
+
+        if self.rebuilding or interval:
+            threading.Thread(target=run, name='search-index-sync', daemon=True).start()
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_search_index():
+    """
+    Возвращает общий экземпляр индекса (создается при первом обращении).
+
+    Новый или не достроенный индекс заполняется из хранилища в фоне,
+    затем индекс периодически дополняется (см. SearchIndex.sync_in_background).
+    """
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = SearchIndex(Config.SEARCH_INDEX_PATH)
+            _index.sync_in_background(get_storage('uploads'), Config.SEARCH_INDEX_SYNC_INTERVAL)
+        return _index
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Индекс поиска изображений')
+    parser.add_argument('--rebuild', action='store_true', help='Перестроить индекс по хранилищу uploads')
+    parser.add_argument('--query', help='Выполнить поиск и вывести результаты')
+    args = parser.parse_args()
+
+    # Без автоматической фоновой перестройки из get_search_index()
+    index = SearchIndex(Config.SEARCH_INDEX_PATH)
+    if args.rebuild:
+        print(f"Проиндексировано изображений: {index.rebuild(get_storage('uploads'))}")
+    if args.query:
+        results, has_more = index.search(args.query)
+        for row in results:
+            print(f"{row['catalog']}/{row['article_folder']}/{row['filename']}")
+        if has_more:
+            print('...')
@@ -0,0 +1,47 @@
+# storage/__init__.py
+import threading
+from config import Config
+from .base_storage import BaseStorage
+from .local_storage import LocalStorage
+
+
+class StorageFactory:
+    """Создает хранилища для областей 'uploads' (изображения) и 'results' (JSON с результатами)"""
+
+    _instances = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def create_storage(area):
+        """Создает экземпляр хранилища для области на основе Config.STORAGE_BACKEND"""
+        local_folders = {
+            'uploads': Config.UPLOAD_FOLDER,
+            'results': Config.RESULTS_FOLDER,
+        }
+        if area not in local_folders:
+            raise ValueError(f"Неизвестная область хранилища: {area}")
+
+        backend = Config.STORAGE_BACKEND
+        if backend == 'local':
+            return LocalStorage(local_folders[area])
+        if backend == 's3':
+            # boto3 нужен только для S3-бэкенда
+            from .s3_storage import S3Storage
+            # В бакете области лежат под теми же префиксами, что и папки на диске
+            return S3Storage(area)
+        raise ValueError(f"Неизвестный бэкенд хранилища: {backend}")
+
+    @classmethod
+    def get_storage(cls, area):
+        """Возвращает общий (кэшированный) экземпляр хранилища для области"""
+        with cls._lock:
+            if area not in cls._instances:
+                cls._instances[area] = cls.create_storage(area)
+            return cls._instances[area]
+
+
+def get_storage(area):
+    return StorageFactory.get_storage(area)
+
+
+__all__ = ['BaseStorage', 'StorageFactory', 'get_storage']
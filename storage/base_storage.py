@@ -0,0 +1,50 @@
+# storage/base_storage.py
+class BaseStorage:
+    """Базовый класс хранилища файлов.
+
+    Ключи - относительные пути с разделителем '/', например
+    'catalog/article/file.jpg'. Конкретный бэкенд сам решает, как ключ
+    превращается в путь на диске или в имя объекта в бакете.
+    """
+
+    def save_file(self, local_path, key, link=False, crc32=None):
+        """
+        Сохраняет локальный файл в хранилище под указанным ключом.
+
+        link=True разрешает сохранить файл жесткой ссылкой вместо копии. Передается
+        только для временных файлов приложения: файл-источник потом не меняется.
+        crc32 - контрольная сумма файла, сохраняется в метаданных (см. get_crc32s).
+        """
+        raise NotImplementedError("Метод save_file должен быть реализован в дочернем классе")
+
+    def write_text(self, key, text):
+        """Записывает текст (UTF-8) под указанным ключом"""
+        raise NotImplementedError("Метод write_text должен быть реализован в дочернем классе")
+
+    def read_text(self, key):
+        """Читает текст (UTF-8) по ключу. Возвращает None, если ключа нет"""
+        raise NotImplementedError("Метод read_text должен быть реализован в дочернем классе")
+
+    def listdir(self, prefix=''):
+        """Возвращает (папки, файлы) непосредственно внутри prefix"""
+        raise NotImplementedError("Метод listdir должен быть реализован в дочернем классе")
+
+    def file_stats(self, prefix=''):
+        """Возвращает {имя файла: (размер, mtime)} для файлов непосредственно внутри prefix"""
+        raise NotImplementedError("Метод file_stats должен быть реализован в дочернем классе")
+
+    def open_read(self, key, start=0):
+        """Открывает файл на чтение (бинарный поток с методами read и close) начиная с байта start"""
+        raise NotImplementedError("Метод open_read должен быть реализован в дочернем классе")
+
+    def get_crc32s(self, keys):
+        """
+        Возвращает {ключ: CRC-32} из метаданных, сохраненных при загрузке (save_file(crc32=...)).
+        Файлов без сохраненной контрольной суммы в результате нет
+        """
+        raise NotImplementedError("Метод get_crc32s должен быть реализован в дочернем классе")
+
+    @staticmethod
+    def join(*parts):
+        """Склеивает части ключа через '/'"""
+        return '/'.join(part.strip('/') for part in parts if part)
@@ -0,0 +1,94 @@
+# storage/local_storage.py
+import os
+import shutil
+from .base_storage import BaseStorage
+
+# Атрибут файла с CRC-32, посчитанной при загрузке
+CRC32_XATTR = 'user.stashlink.crc32'
+
+
+class LocalStorage(BaseStorage):
+    """Хранилище в локальной папке (uploads/, results/)"""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key):
+        """Преобразует ключ в путь на диске"""
+        return os.path.join(self.root, *[part for part in key.split('/') if part])
+
+    def save_file(self, local_path, key, link=False, crc32=None):
+        target_path = self._path(key)
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        # Временный файл приложения на том же диске достаточно связать жесткой ссылкой.
+        # Чужие файлы (папка наблюдения) всегда копируются: иначе их изменение
+        # изменило бы и опубликованное изображение
+        linked = False
+        if link:
+            try:
+                os.link(local_path, target_path)
+                linked = True
+            except OSError:
+                pass
+        if not linked:
+            shutil.copy2(local_path, target_path)
+        if crc32 is not None:
+            # Расширенный атрибут файла; если ФС их не поддерживает, CRC посчитается при скачивании
+            try:
+                os.setxattr(target_path, CRC32_XATTR, f"{crc32:08x}".encode('ascii'))
+            except (AttributeError, OSError):
+                pass
+
+    def write_text(self, key, text):
+        target_path = self._path(key)
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        with open(target_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def read_text(self, key):
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def listdir(self, prefix=''):
+        path = self._path(prefix)
+        dirs, files = [], []
+        if not os.path.isdir(path):
+            return dirs, files
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    dirs.append(entry.name)
+                elif entry.is_file():
+                    files.append(entry.name)
+        return dirs, files
+
+    def file_stats(self, prefix=''):
+        path = self._path(prefix)
+        stats = {}
+        if not os.path.isdir(path):
+            return stats
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    stat = entry.stat()
+                    stats[entry.name] = (stat.st_size, stat.st_mtime)
+        return stats
+
+    def get_crc32s(self, keys):
+        crcs = {}
+        for key in keys:
+            try:
+                crcs[key] = int(os.getxattr(self._path(key), CRC32_XATTR), 16)
+            except (AttributeError, OSError, ValueError):
+                pass
+        return crcs
+
+    def open_read(self, key, start=0):
+        f = open(self._path(key), 'rb')
+        if start:
+            f.seek(start)
+        return f
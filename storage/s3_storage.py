@@ -0,0 +1,149 @@
+# storage/s3_storage.py
+import mimetypes
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config as BotoConfig
+from botocore.exceptions import ClientError
+from config import Config
+from .base_storage import BaseStorage
+
+# Один клиент на процесс: boto3-клиент потокобезопасен и держит общий пул соединений
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_s3_client():
+    """Возвращает общий S3-клиент с пулом соединений"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = boto3.client(
+                's3',
+                endpoint_url=Config.S3_ENDPOINT_URL,
+                aws_access_key_id=Config.S3_ACCESS_KEY,
+                aws_secret_access_key=Config.S3_SECRET_KEY,
+                region_name=Config.S3_REGION,
+                config=BotoConfig(
+                    max_pool_connections=Config.S3_MAX_POOL_CONNECTIONS,
+                    # MinIO и другие локальные заменители S3 работают только с path-style адресами
+                    s3={'addressing_style': 'path'},
+                    retries={'max_attempts': 5, 'mode': 'standard'},
+                ),
+            )
+        return _client
+
+
+class S3Storage(BaseStorage):
+    """Хранилище в S3-совместимом бакете (AWS S3, MinIO и т.п.)"""
+
+    def __init__(self, prefix):
+        self.bucket = Config.S3_BUCKET
+        self.prefix = prefix.strip('/')
+        self.client = get_s3_client()
+        # Большие файлы загружаются частями в несколько потоков
+        self.transfer_config = TransferConfig(
+            multipart_threshold=Config.S3_MULTIPART_THRESHOLD,
+            multipart_chunksize=Config.S3_MULTIPART_CHUNKSIZE,
+            max_concurrency=Config.S3_MAX_CONCURRENCY,
+            use_threads=True,
+        )
+        self._check_bucket()
+
+    def _check_bucket(self):
+        """
+        Проверяет, что бакет существует.
+
+        Бакет и публичное чтение префикса uploads/ (nginx отдает /images/ без подписи)
+        настраиваются один раз при развертывании (для MinIO - контейнер minio-init
+        в docker-compose.yml), а не приложением: ему не нужны права на политики бакета.
+        """
+        try:
+            self.client.head_bucket(Bucket=self.bucket)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchBucket'):
+                raise RuntimeError(f"Бакет {self.bucket} не найден - создайте его перед запуском приложения") from e
+            raise
+
+    def _key(self, key):
+        """Преобразует ключ хранилища в имя объекта в бакете"""
+        return self.join(self.prefix, key)
+
+    def save_file(self, local_path, key, link=False, crc32=None):
+        extra_args = {'ContentType': mimetypes.guess_type(local_path)[0] or 'application/octet-stream'}
+        if crc32 is not None:
+            extra_args['Metadata'] = {'crc32': f"{crc32:08x}"}
+        self.client.upload_file(
+            local_path,
+            self.bucket,
+            self._key(key),
+            ExtraArgs=extra_args,
+            Config=self.transfer_config,
+        )
+
+    def write_text(self, key, text):
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=self._key(key),
+            Body=text.encode('utf-8'),
+            ContentType='application/json; charset=utf-8' if key.endswith('.json') else 'text/plain; charset=utf-8',
+        )
+
+    def read_text(self, key):
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey'):
+                return None
+            raise
+        return response['Body'].read().decode('utf-8')
+
+    def listdir(self, prefix=''):
+        full_prefix = self._key(prefix)
+        if full_prefix:
+            full_prefix += '/'
+        dirs, files = [], []
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=full_prefix, Delimiter='/'):
+            for common_prefix in page.get('CommonPrefixes', []):
+                dirs.append(common_prefix['Prefix'][len(full_prefix):].rstrip('/'))
+            for obj in page.get('Contents', []):
+                name = obj['Key'][len(full_prefix):]
+                if name:
+                    files.append(name)
+        return dirs, files
+
+    def file_stats(self, prefix=''):
+        full_prefix = self._key(prefix)
+        if full_prefix:
+            full_prefix += '/'
+        stats = {}
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=full_prefix, Delimiter='/'):
+            for obj in page.get('Contents', []):
+                name = obj['Key'][len(full_prefix):]
+                if name:
+                    stats[name] = (obj['Size'], obj['LastModified'].timestamp())
+        return stats
+
+    def _head_crc32(self, key):
+        try:
+            metadata = self.client.head_object(Bucket=self.bucket, Key=self._key(key)).get('Metadata', {})
+            return int(metadata['crc32'], 16)
+        except (ClientError, KeyError, ValueError):
+            return None
+
+    def get_crc32s(self, keys):
+        # Метаданные есть только в HEAD-ответе - запросы идут параллельно через общий пул соединений
+        keys = list(keys)
+        with ThreadPoolExecutor(Config.S3_MAX_POOL_CONNECTIONS) as executor:
+            crcs = dict(zip(keys, executor.map(self._head_crc32, keys)))
+        return {key: crc for key, crc in crcs.items() if crc is not None}
+
+    def open_read(self, key, start=0):
+        params = {'Bucket': self.bucket, 'Key': self._key(key)}
+        if start:
+            params['Range'] = f"bytes={start}-"
+        # Тело ответа читается потоком, объект целиком в память не загружается
+        return self.client.get_object(**params)['Body']
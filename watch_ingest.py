@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+# watch_ingest.py
+"""
+Загрузка изображений из папки на общем диске, без ZIP-архива и браузера.
+
+Фотографы складывают готовые съемки в Config.WATCH_FOLDER в виде
+<каталог>/<артикул>/<изображения>. Демон находит новые файлы (через
+inotify, если установлен пакет watchdog, иначе периодическим обходом папки),
+сохраняет их с теми же именами, миниатюрами и URL, что и при загрузке
+ZIP-архива, и создает результат, доступный по /admin/results/<id>.
+
+Файл считается дописанным, если не менялся Config.WATCH_SETTLE_SECONDS секунд.
+Результат каталога создается один на всю съемку: когда в каталоге не осталось
+недописанных файлов и на очередном проходе не появилось новых.
+Загруженные файлы запоминаются в Config.WATCH_CHECKPOINT_PATH, поэтому после
+перезапуска демон продолжает с того места, где остановился.
+
+Примеры:
+    python watch_ingest.py                 # следить за папкой
+    python watch_ingest.py --once          # один проход и выход
+    python watch_ingest.py --poll --interval 30
+"""
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from config import Config, allowed_file, init_folders
+from storage import get_storage
+from zip_preflight import IGNORED_FILES, IGNORED_FOLDERS
+from ingest import ingest_image_file, index_images, save_results_to_file
+from image_record import ImageRecord
+
+try:
+    # inotify (Linux) и аналоги на других ОС; без watchdog работаем обходом папки
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+# Как часто сохранять контрольную точку во время большой загрузки
+CHECKPOINT_EVERY = 100
+
+CHECKPOINT_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    rel_path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pending (
+    id INTEGER PRIMARY KEY,
+    catalog TEXT NOT NULL,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pending_catalog ON pending (catalog, id);
+'''
+
+
+class Checkpoint:
+    """
+    Контрольная точка загрузки (SQLite).
+
+    files - уже загруженные файлы: относительный путь, размер, mtime_ns.
+    pending - загруженные изображения (ImageRecord.to_row()) по каталогам,
+    для которых еще не создан результат.
+
+    Изменения копятся в транзакции и записываются пачкой в save(): каждый
+    файл - одна строка, поэтому запись не растет с числом загруженных файлов.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript(CHECKPOINT_SCHEMA)
+        self._import_legacy(os.path.splitext(path)[0] + '.json')
+
+    def _import_legacy(self, legacy_path):
+        """Переносит контрольную точку прежнего формата (JSON), чтобы не загружать файлы повторно"""
+        if not os.path.exists(legacy_path) or \
+                self.connection.execute('SELECT 1 FROM files LIMIT 1').fetchone() is not None:
+            return
+        with open(legacy_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO files (rel_path, size, mtime_ns) VALUES (?, ?, ?)',
+                ((rel_path, size, mtime_ns) for rel_path, (size, mtime_ns) in data.get('files', {}).items()))
+            self.connection.executemany(
+                'INSERT INTO pending (catalog, record) VALUES (?, ?)',
+                ((catalog, json.dumps(row, ensure_ascii=False))
+                 for catalog, rows in data.get('pending', {}).items() for row in rows))
+        os.replace(legacy_path, f"{legacy_path}.imported")
+        print(f"Контрольная точка {legacy_path} перенесена в {self.path}")
+
+    def is_done(self, rel_path, signature):
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT size, mtime_ns FROM files WHERE rel_path = ?', (rel_path,)).fetchone()
+        return row == tuple(signature)
+
+    def mark_done(self, rel_path, signature, catalog, record):
+        with self.lock:
+            self.connection.execute('INSERT OR REPLACE INTO files (rel_path, size, mtime_ns) VALUES (?, ?, ?)',
+                                    (rel_path, *signature))
+            self.connection.execute('INSERT INTO pending (catalog, record) VALUES (?, ?)',
+                                    (catalog, json.dumps(record.to_row(), ensure_ascii=False)))
+
+    def pending_catalogs(self):
+        with self.lock:
+            return [row[0] for row in self.connection.execute('SELECT DISTINCT catalog FROM pending')]
+
+    def pending_rows(self, catalog):
+        with self.lock:
+            return [json.loads(row[0]) for row in self.connection.execute(
+                'SELECT record FROM pending WHERE catalog = ? ORDER BY id', (catalog,))]
+
+    def clear_pending(self, catalog):
+        """Удаляет изображения каталога, для которых создан результат"""
+        with self.lock:
+            self.connection.execute('DELETE FROM pending WHERE catalog = ?', (catalog,))
+            self.connection.commit()
+
+    def save(self):
+        """Записывает накопленные изменения"""
+        with self.lock:
+            self.connection.commit()
+
+
+class ChangeHandler(FileSystemEventHandler):
+    """Запоминает пути, которые изменились, чтобы не обходить всю папку"""
+
+    def __init__(self):
+        self.changed = set()
+        self.lock = threading.Lock()
+        self.event = threading.Event()
+
+    def on_any_event(self, event):
+        with self.lock:
+            self.changed.add(event.src_path)
+            if getattr(event, 'dest_path', None):
+                self.changed.add(event.dest_path)
+        self.event.set()
+
+    def take_changed(self):
+        with self.lock:
+            changed, self.changed = self.changed, set()
+        self.event.clear()
+        return changed
+
+
+class WatchIngest:
+    """Находит новые изображения в папке и загружает их"""
+
+    def __init__(self, watch_dir, workers, settle_seconds, checkpoint_path):
+        self.watch_dir = os.path.abspath(watch_dir)
+        self.workers = workers
+        self.settle_seconds = settle_seconds
+        self.checkpoint = Checkpoint(checkpoint_path)
+        self.uploads = get_storage('uploads')
+        # Файлы, которые еще дописываются - проверяем их на каждом проходе
+        self.unsettled = set()
+
+    def _candidate(self, path, now):
+        """
+        Проверяет файл. Возвращает (отн. путь, каталог, артикул, подпись) для готового
+        к загрузке файла или None. Недописанные файлы запоминаются в self.unsettled.
+        """
+        rel_path = os.path.relpath(path, self.watch_dir)
+        parts = rel_path.split(os.sep)
+        file = parts[-1]
+        # Нужна структура <каталог>/<артикул>/.../<файл>
+        if len(parts) < 3 or parts[0] in IGNORED_FOLDERS:
+            return None
+        if file.startswith('.') or file.lower() in IGNORED_FILES or not allowed_file(file):
+            return None
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self.unsettled.discard(rel_path)
+            return None
+
+        signature = (stat.st_size, stat.st_mtime_ns)
+        if self.checkpoint.is_done(rel_path, signature):
+            self.unsettled.discard(rel_path)
+            return None
+        if now - stat.st_mtime < self.settle_seconds:
+            self.unsettled.add(rel_path)
+            return None
+        self.unsettled.discard(rel_path)
+        return rel_path, parts[0], parts[1], signature
+
+    def scan(self, paths=None):
+        """
+        Ищет готовые к загрузке файлы.
+
+        Args:
+            paths (iterable): Изменившиеся файлы и папки. None - обойти всю папку.
+        """
+        now = time.time()
+        if paths is None:
+            paths = [self.watch_dir]
+        # Недописанные в прошлый раз файлы проверяем снова
+        paths = set(paths) | {os.path.join(self.watch_dir, rel_path) for rel_path in self.unsettled}
+
+        found = {}
+        for path in paths:
+            if os.path.isdir(path):
+                for root, dirs, files in os.walk(path):
+                    dirs[:] = [d for d in dirs if not d.startswith('.') and d not in IGNORED_FOLDERS]
+                    for file in files:
+                        candidate = self._candidate(os.path.join(root, file), now)
+                        if candidate:
+                            found[candidate[0]] = candidate
+            elif os.path.isfile(path) and path.startswith(self.watch_dir + os.sep):
+                candidate = self._candidate(path, now)
+                if candidate:
+                    found[candidate[0]] = candidate
+        return sorted(found.values())
+
+    def ingest(self, candidates):
+        """Загружает файлы параллельно, сохраняя контрольную точку по ходу работы"""
+        if not candidates:
+            return
+        print(f"Найдено новых изображений: {len(candidates)}")
+        records = []
+
+        with tempfile.TemporaryDirectory() as thumb_dir, ThreadPoolExecutor(self.workers) as executor:
+            futures = {
+                executor.submit(ingest_image_file, os.path.join(self.watch_dir, rel_path),
+                                catalog, article, self.uploads, thumb_dir): (rel_path, catalog, signature)
+                for rel_path, catalog, article, signature in candidates
+            }
+            for done_count, future in enumerate(as_completed(futures), 1):
+                rel_path, catalog, signature = futures[future]
+                try:
+                    record = future.result()
+                except Exception as e:
+                    print(f"Ошибка при загрузке {rel_path}: {e}")
+                    continue
+                self.checkpoint.mark_done(rel_path, signature, catalog, record)
+                records.append(record)
+                if done_count % CHECKPOINT_EVERY == 0:
+                    index_images(records)
+                    records = []
+                    self.checkpoint.save()
+                    print(f"Загружено {done_count} из {len(candidates)}")
+
+        index_images(records)
+        self.checkpoint.save()
+
+    def save_results(self, busy_catalogs=()):
+        """
+        Создает результаты (по одному на каталог) для загруженных изображений.
+
+        Args:
+            busy_catalogs (iterable): Каталоги, в которые еще копируется съемка - их
+                изображения остаются в контрольной точке до следующего прохода.
+        """
+        for catalog in self.checkpoint.pending_catalogs():
+            if catalog in busy_catalogs:
+                continue
+            image_data = sorted((ImageRecord.from_row(row) for row in self.checkpoint.pending_rows(catalog)),
+                                key=lambda record: (record.article, record.filename))
+            result_id = save_results_to_file(image_data, catalog)
+            self.checkpoint.clear_pending(catalog)
+            print(f"Каталог {catalog}: {len(image_data)} изображений, результат /admin/results/{result_id}")
+
+    def process(self, candidates):
+        """Загружает найденные файлы и создает результаты для каталогов, в которых все дописано"""
+        self.ingest(candidates)
+        busy_catalogs = {catalog for _, catalog, _, _ in candidates}
+        busy_catalogs.update(rel_path.split(os.sep)[0] for rel_path in self.unsettled)
+        self.save_results(busy_catalogs)
+
+    def run_once(self):
+        self.process(self.scan())
+        # Файлы, которые еще дописывались, дожидаемся
+        while self.unsettled:
+            time.sleep(1)
+            self.process(self.scan([]))
+        self.save_results()
+
+    def run_forever(self, interval, use_inotify):
+        handler = None
+        if use_inotify and Observer is not None:
+            handler = ChangeHandler()
+            observer = Observer()
+            observer.schedule(handler, self.watch_dir, recursive=True)
+            observer.daemon = True
+            observer.start()
+            print(f"Слежу за {self.watch_dir} (inotify)")
+        else:
+            print(f"Слежу за {self.watch_dir} (проверка каждые {interval} с)")
+
+        last_full_scan = 0
+        while True:
+            if handler is None or time.monotonic() - last_full_scan >= Config.WATCH_FULL_RESCAN_INTERVAL:
+                if handler is not None:
+                    handler.take_changed()
+                last_full_scan = time.monotonic()
+                self.process(self.scan())
+            else:
+                self.process(self.scan(handler.take_changed()))
+
+            if handler is not None:
+                handler.event.wait(interval)
+                # Даем пачке событий накопиться
+                time.sleep(1)
+            else:
+                time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Загрузка изображений из папки на общем диске')
+    parser.add_argument('--watch-dir', default=Config.WATCH_FOLDER, help='Папка вида <каталог>/<артикул>/<изображения>')
+    parser.add_argument('--once', action='store_true', help='Один проход по папке и выход')
+    parser.add_argument('--poll', action='store_true', help='Не использовать inotify, только обход папки')
+    parser.add_argument('--interval', type=int, default=Config.WATCH_POLL_INTERVAL, help='Секунд между проверками')
+    parser.add_argument('--workers', type=int, default=Config.WATCH_WORKERS, help='Изображений параллельно')
+    parser.add_argument('--settle', type=int, default=Config.WATCH_SETTLE_SECONDS,
+                        help='Сколько секунд файл не должен меняться, чтобы считаться дописанным')
+    parser.add_argument('--checkpoint', default=Config.WATCH_CHECKPOINT_PATH, help='Файл контрольной точки')
+    args = parser.parse_args()
+
+    init_folders()
+    os.makedirs(args.watch_dir, exist_ok=True)
+    watcher = WatchIngest(args.watch_dir, args.workers, args.settle, args.checkpoint)
+    if args.once:
+        watcher.run_once()
+    else:
+        try:
+            watcher.run_forever(args.interval, use_inotify=not args.poll)
+        except KeyboardInterrupt:
+            watcher.checkpoint.save()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+# zip_preflight.py
+import collections
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from config import Config, allowed_file
+
+# Служебные файлы, которые не считаются изображениями
+IGNORED_FILES = {'thumbs.db', '.ds_store'}
+# Служебная папка macOS внутри архивов
+IGNORED_FOLDERS = {'__MACOSX'}
+
+
+class ZipPreflightError(Exception):
+    """Архив отклонен до распаковки. Текст ошибки показывается пользователю"""
+    pass
+
+
+class ZipInspection:
+    """Результат чтения центрального каталога архива (без распаковки)"""
+
+    def __init__(self, members, articles, total_size, compressed_size):
+        self.members = members  # ZipInfo подходящих изображений
+        self.articles = articles  # Имена папок артикулов
+        self.total_size = total_size  # Суммарный размер изображений после распаковки
+        self.compressed_size = compressed_size
+
+
+def inspect_zip_archive(zip_ref):
+    """
+    Проверяет архив по центральному каталогу, ничего не распаковывая.
+
+    Args:
+        zip_ref (zipfile.ZipFile): Открытый архив.
+
+    Returns:
+        ZipInspection: Список подходящих изображений и их суммарный размер.
+
+    Raises:
+        ZipPreflightError: Если архив небезопасен или в нем нет подходящих изображений.
+    """
+    members = []
+    articles = set()
+    total_size = 0
+    compressed_size = 0
+    root_images = 0
+
+    for info in zip_ref.infolist():
+        if info.is_dir():
+            continue
+        parts = [part for part in info.filename.replace('\\', '/').split('/') if part]
+        if info.filename.startswith('/') or '..' in parts:
+            raise ZipPreflightError(f'Архив содержит недопустимый путь: {info.filename}')
+
+        file = parts[-1]
+        if file.lower() in IGNORED_FILES or parts[0] in IGNORED_FOLDERS:
+            continue
+        if not allowed_file(file):
+            continue
+        # Изображения должны лежать в папке артикула: <артикул>/<файл>
+        if len(parts) < 2:
+            root_images += 1
+            continue
+        if info.flag_bits & 0x1:
+            raise ZipPreflightError(f'Архив содержит зашифрованный файл: {info.filename}')
+
+        # Коэффициент сжатия проверяем только у крупных файлов: у мелких он бывает большим и без подвоха
+        if info.file_size >= 1024 * 1024 and \
+                info.file_size > info.compress_size * Config.ZIP_MAX_COMPRESSION_RATIO:
+            raise ZipPreflightError(
+                f'Недопустимая степень сжатия файла {info.filename} - архив похож на zip-бомбу')
+
+        members.append(info)
+        articles.add(parts[0])
+        total_size += info.file_size
+        compressed_size += info.compress_size
+
+    if not members:
+        if root_images:
+            raise ZipPreflightError(
+                'В архиве не найдено подходящих изображений: изображения должны лежать в папках артикулов')
+        raise ZipPreflightError('В архиве не найдено подходящих изображений')
+
+    if total_size >= 1024 * 1024 and total_size > compressed_size * Config.ZIP_MAX_COMPRESSION_RATIO:
+        raise ZipPreflightError('Недопустимая степень сжатия архива - архив похож на zip-бомбу')
+
+    if total_size > Config.ZIP_MAX_UNCOMPRESSED_SIZE:
+        raise ZipPreflightError(
+            f'Архив слишком большой после распаковки: {total_size // (1024 * 1024)} МБ')
+
+    return ZipInspection(members, articles, total_size, compressed_size)
+
+
+def check_disk_space(required_size, reserved_size=0):
+    """
+    Проверяет, что распакованные изображения поместятся на диск.
+
+    Изображения распаковываются во временную папку. При локальном хранилище они
+    сохраняются в uploads/: на том же диске - жесткой ссылкой (место занимается
+    один раз), на другом диске - копией (место нужно и там).
+
+    Args:
+        required_size (int): Суммарный размер изображений после распаковки.
+        reserved_size (int): Место, уже занятое архивами, которые обрабатываются сейчас.
+
+    Raises:
+        ZipPreflightError: Если свободного места не хватает.
+    """
+    folders = [tempfile.gettempdir()]
+    if Config.STORAGE_BACKEND == 'local':
+        os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
+        folders.append(Config.UPLOAD_FOLDER)
+
+    # Папки на одном диске учитываются один раз: файлы в uploads/ - жесткие ссылки на распакованные
+    folder_by_device = {}
+    for folder in folders:
+        folder_by_device.setdefault(os.stat(folder).st_dev, folder)
+
+    for folder in folder_by_device.values():
+        free = shutil.disk_usage(folder).free - reserved_size - Config.ZIP_MIN_FREE_SPACE
+        if required_size > free:
+            raise ZipPreflightError(
+                f'Недостаточно места на диске для распаковки архива: нужно {required_size // (1024 * 1024)} МБ, '
+                f'доступно {max(free, 0) // (1024 * 1024)} МБ')
+
+
+class ArchiveAdmission:
+    """
+    Ограничивает число архивов, которые распаковываются одновременно.
+
+    Остальные загрузки ждут в очереди (в порядке поступления), пока не
+    освободится место, вместо того чтобы одновременно нагружать диск.
+    Место на диске, нужное уже обрабатываемым архивам, резервируется.
+
+    Очередь и резерв места действуют в пределах одного процесса. Если
+    приложение запущено в нескольких процессах или на нескольких узлах,
+    у каждого своя очередь: одновременно обрабатывается до
+    MAX_CONCURRENT_ARCHIVES архивов на процесс.
+    """
+
+    def __init__(self, max_active, timeout):
+        self.max_active = max_active
+        self.timeout = timeout
+        self._condition = threading.Condition()
+        self._queue = collections.deque()
+        self._active = 0
+        self._reserved = 0
+
+    @contextmanager
+    def slot(self, inspection):
+        """Ждет своей очереди, проверяет место на диске и держит слот на время обработки"""
+        ticket = object()
+        deadline = time.monotonic() + self.timeout
+        with self._condition:
+            self._queue.append(ticket)
+            while self._queue[0] is not ticket or self._active >= self.max_active:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._queue.remove(ticket)
+                    self._condition.notify_all()
+                    raise ZipPreflightError('Сервер занят обработкой других архивов, попробуйте позже')
+                self._condition.wait(remaining)
+            self._queue.popleft()
+            try:
+                check_disk_space(inspection.total_size, self._reserved)
+            finally:
+                # Следующий в очереди может проверить свой архив
+                self._condition.notify_all()
+            self._active += 1
+            self._reserved += inspection.total_size
+
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._active -= 1
+                self._reserved -= inspection.total_size
+                self._condition.notify_all()
+
+
+archive_admission = ArchiveAdmission(Config.MAX_CONCURRENT_ARCHIVES, Config.ARCHIVE_QUEUE_TIMEOUT)
@@ -0,0 +1,276 @@
+# zip_stream.py
+"""
+Потоковая сборка ZIP-архива из файлов хранилища.
+
+Архив не собирается ни в памяти, ни во временном файле: байты генерируются
+по мере отдачи клиенту. Все записи сохраняются без сжатия (STORED) - JPEG,
+PNG, GIF и WebP уже сжаты, - поэтому размер архива и положение каждого
+байта известны заранее. Это дает точный Content-Length и позволяет
+отдавать произвольный диапазон байт (докачка через HTTP Range).
+
+Контрольная сумма CRC-32 пишется в дескрипторе данных после содержимого
+файла (флаг 3) и в центральном каталоге. При полной отдаче она считается
+по ходу чтения. При докачке с середины CRC уже отданных файлов берется из
+метаданных хранилища (сохраняется при загрузке, ingest.file_crc32) без
+чтения самих файлов. Только файлы, загруженные до появления метаданных,
+перечитываются для подсчета CRC (результат кэшируется в процессе).
+"""
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+CHUNK_SIZE = 256 * 1024
+
+# Флаги записи: 3 - CRC и размеры в дескрипторе после данных, 11 - имя файла в UTF-8
+FLAGS = 0x0808
+ZIP64_LIMIT = 0xFFFFFFFF
+VERSION_DEFAULT = 20
+VERSION_ZIP64 = 45
+
+# Кэш CRC-32 уже прочитанных файлов: (ключ, размер, mtime) -> crc
+_crc_cache = OrderedDict()
+_crc_cache_lock = threading.Lock()
+CRC_CACHE_SIZE = 100000
+
+
+def _cached_crc(cache_key):
+    with _crc_cache_lock:
+        crc = _crc_cache.get(cache_key)
+        if crc is not None:
+            _crc_cache.move_to_end(cache_key)
+        return crc
+
+
+def _store_crc(cache_key, crc):
+    with _crc_cache_lock:
+        _crc_cache[cache_key] = crc
+        _crc_cache.move_to_end(cache_key)
+        while len(_crc_cache) > CRC_CACHE_SIZE:
+            _crc_cache.popitem(last=False)
+
+
+def _dos_datetime(timestamp):
+    """Дата и время в формате MS-DOS, как их хранит ZIP"""
+    t = time.localtime(max(timestamp, 315532800))  # Не раньше 1980 года
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+
+class ZipEntry:
+    """Файл архива и его расположение внутри архива"""
+
+    def __init__(self, arcname, key, size, mtime, offset):
+        self.arcname = arcname
+        self.name_bytes = arcname.encode('utf-8')
+        self.key = key
+        self.size = size
+        self.mtime = mtime
+        self.dos_time, self.dos_date = _dos_datetime(mtime)
+        self.offset = offset  # Смещение локального заголовка
+        self.zip64_size = size >= ZIP64_LIMIT
+        self.zip64 = self.zip64_size or offset >= ZIP64_LIMIT
+        self.local_header = self._local_header()
+        self.data_offset = offset + len(self.local_header)
+        self.descriptor_size = 24 if self.zip64_size else 16
+        self.end = self.data_offset + size + self.descriptor_size
+
+    def _local_header(self):
+        extra = b''
+        size_field = self.size
+        if self.zip64_size:
+            extra = struct.pack('<HHQQ', 0x0001, 16, self.size, self.size)
+            size_field = ZIP64_LIMIT
+        # Размеры известны заранее и пишутся сразу, CRC - в дескрипторе после данных
+        return struct.pack(
+            '<IHHHHHIIIHH', 0x04034b50,
+            VERSION_ZIP64 if self.zip64_size else VERSION_DEFAULT, FLAGS, 0,
+            self.dos_time, self.dos_date, 0, size_field, size_field,
+            len(self.name_bytes), len(extra)
+        ) + self.name_bytes + extra
+
+    def descriptor(self, crc):
+        if self.zip64_size:
+            return struct.pack('<IIQQ', 0x08074b50, crc, self.size, self.size)
+        return struct.pack('<IIII', 0x08074b50, crc, self.size, self.size)
+
+    def central_header(self, crc):
+        extra_fields = []
+        size_field = self.size
+        offset_field = self.offset
+        if self.zip64_size:
+            extra_fields += [self.size, self.size]
+            size_field = ZIP64_LIMIT
+        if self.offset >= ZIP64_LIMIT:
+            extra_fields.append(self.offset)
+            offset_field = ZIP64_LIMIT
+        extra = b''
+        if extra_fields:
+            extra = struct.pack(f'<HH{len(extra_fields)}Q', 0x0001, 8 * len(extra_fields), *extra_fields)
+        version = VERSION_ZIP64 if self.zip64 else VERSION_DEFAULT
+        return struct.pack(
+            '<IHHHHHHIIIHHHHHII', 0x02014b50, version, version, FLAGS, 0,
+            self.dos_time, self.dos_date, crc, size_field, size_field,
+            len(self.name_bytes), len(extra), 0, 0, 0, 0, offset_field
+        ) + self.name_bytes + extra
+
+    def central_header_size(self):
+        extra_size = 0
+        if self.zip64_size:
+            extra_size += 16
+        if self.offset >= ZIP64_LIMIT:
+            extra_size += 8
+        return 46 + len(self.name_bytes) + (4 + extra_size if extra_size else 0)
+
+
+class StreamingZip:
+    """
+    ZIP-архив из файлов хранилища, который отдается потоком.
+
+    Args:
+        storage (BaseStorage): Хранилище, из которого читаются файлы.
+        files (list): Кортежи (имя в архиве, ключ в хранилище, размер, mtime).
+    """
+
+    def __init__(self, storage, files):
+        self.storage = storage
+        self._crcs = {}  # CRC-32 файлов, прочитанных при текущей отдаче
+        self.entries = []
+        offset = 0
+        for arcname, key, size, mtime in files:
+            entry = ZipEntry(arcname, key, size, mtime, offset)
+            self.entries.append(entry)
+            offset = entry.end
+
+        self.central_offset = offset
+        self.central_size = sum(entry.central_header_size() for entry in self.entries)
+        self.zip64 = (len(self.entries) >= 0xFFFF or self.central_offset >= ZIP64_LIMIT
+                      or self.central_size >= ZIP64_LIMIT)
+        self.end_size = 22 + (56 + 20 if self.zip64 else 0)
+        self.total_size = self.central_offset + self.central_size + self.end_size
+
+    def _end_records(self):
+        entries_count = len(self.entries)
+        records = b''
+        if self.zip64:
+            zip64_end_offset = self.central_offset + self.central_size
+            records += struct.pack('<IQHHIIQQQQ', 0x06064b50, 44, VERSION_ZIP64, VERSION_ZIP64, 0, 0,
+                                   entries_count, entries_count, self.central_size, self.central_offset)
+            records += struct.pack('<IIQI', 0x07064b50, 0, zip64_end_offset, 1)
+        records += struct.pack('<IHHHHIIH', 0x06054b50, 0, 0,
+                               min(entries_count, 0xFFFF), min(entries_count, 0xFFFF),
+                               min(self.central_size, ZIP64_LIMIT), min(self.central_offset, ZIP64_LIMIT), 0)
+        return records
+
+    def _read_file(self, entry, start, send_from, send_to):
+        """
+        Читает файл с позиции start, считая CRC, и отдает байты в [send_from, send_to)
+        (позиции внутри файла).
+        """
+        crc = zlib.crc32(b'') if start == 0 else None
+        source = self.storage.open_read(entry.key, start)
+        try:
+            position = start
+            while position < entry.size:
+                chunk = source.read(min(CHUNK_SIZE, entry.size - position))
+                if not chunk:
+                    raise IOError(f"Файл {entry.key} оказался короче, чем ожидалось")
+                if crc is not None:
+                    crc = zlib.crc32(chunk, crc)
+                chunk_end = position + len(chunk)
+                if chunk_end > send_from and position < send_to:
+                    yield chunk[max(send_from - position, 0):send_to - position]
+                elif position >= send_to and crc is None:
+                    break
+                position = chunk_end
+        finally:
+            source.close()
+        if crc is not None:
+            _store_crc((entry.key, entry.size, entry.mtime), crc)
+            self._crcs[entry.key] = crc
+
+    def _known_crc(self, entry):
+        """CRC-32 файла, если она уже известна (прочитан при этой отдаче, метаданные или кэш)"""
+        crc = self._crcs.get(entry.key)
+        if crc is None:
+            crc = _cached_crc((entry.key, entry.size, entry.mtime))
+        return crc
+
+    def _crc(self, entry):
+        """CRC-32 файла: известная или по полному чтению файла (без отдачи клиенту)"""
+        crc = self._known_crc(entry)
+        if crc is None:
+            for _ in self._read_file(entry, 0, 0, 0):
+                pass
+            crc = self._crcs[entry.key]
+        self._crcs[entry.key] = crc
+        return crc
+
+    def _load_stored_crcs(self, start, end):
+        """
+        Берет из метаданных хранилища CRC файлов, начало которых клиент уже получил,
+        а дескриптор или центральный каталог попадает в запрошенный диапазон.
+        """
+        with_central = end > self.central_offset
+        entries = [entry for entry in self.entries
+                   if entry.data_offset < start
+                   and (with_central or entry.end > start and entry.data_offset + entry.size < end)
+                   and self._known_crc(entry) is None]
+        if not entries:
+            return
+        stored = self.storage.get_crc32s(entry.key for entry in entries)
+        for entry in entries:
+            crc = stored.get(entry.key)
+            if crc is not None:
+                self._crcs[entry.key] = crc
+                _store_crc((entry.key, entry.size, entry.mtime), crc)
+
+    @staticmethod
+    def _slice(data, data_start, range_start, range_end):
+        """Часть data (начинается с позиции data_start в архиве), попадающая в [range_start, range_end)"""
+        return data[max(range_start - data_start, 0):max(range_end - data_start, 0)]
+
+    def iter_bytes(self, start=0, end=None):
+        """
+        Генерирует байты архива в диапазоне [start, end).
+
+        Args:
+            start (int): Первый байт.
+            end (int): Позиция после последнего байта (по умолчанию - конец архива).
+        """
+        if end is None:
+            end = self.total_size
+        self._crcs = {}
+        if start > 0:
+            self._load_stored_crcs(start, end)
+
+        for entry in self.entries:
+            if entry.offset >= end:
+                return
+            if entry.end <= start:
+                continue
+            if entry.data_offset > start:
+                yield self._slice(entry.local_header, entry.offset, start, end)
+
+            data_end = entry.data_offset + entry.size
+            if data_end > start and entry.data_offset < end:
+                send_from = max(start - entry.data_offset, 0)
+                send_to = min(end, data_end) - entry.data_offset
+                # Читать с начала нужно, если дальше понадобится CRC (дескриптор или центральный каталог)
+                need_crc = end > data_end and self._known_crc(entry) is None
+                read_from = 0 if need_crc else send_from
+                yield from self._read_file(entry, read_from, send_from, send_to)
+
+            if end > data_end:
+                yield self._slice(entry.descriptor(self._crc(entry)), data_end, start, end)
+
+        if end > self.central_offset:
+            position = self.central_offset
+            for entry in self.entries:
+                header_size = entry.central_header_size()
+                if position + header_size > start and position < end:
+                    yield self._slice(entry.central_header(self._crc(entry)), position, start, end)
+                position += header_size
+            yield self._slice(self._end_records(), position, start, end)